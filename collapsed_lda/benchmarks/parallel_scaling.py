@@ -0,0 +1,65 @@
+"""Benchmark the throughput scaling of AD-LDA (fit with n_jobs > 1) against the serial sampler on a synthetic corpus
+drawn from the LDA generative process. To be run from the repo root."""
+import os
+from time import perf_counter
+
+import click
+import numpy as np
+
+from collapsed_lda.lda import LatentDirichletAllocation
+
+
+def generate_corpus(n_docs, doc_length, vocab_size, k, seed=0):
+    """Draw a corpus from the LDA generative process with symmetric priors"""
+    rng = np.random.default_rng(seed)
+    phi = rng.dirichlet(np.full(vocab_size, 0.05), size=k)
+    doc_to_tokens = {}
+    for d in range(n_docs):
+        theta = rng.dirichlet(np.full(k, 0.1))
+        topics = rng.choice(k, size=doc_length, p=theta)
+        words = [rng.choice(vocab_size, p=phi[topic]) for topic in topics]
+        doc_to_tokens[d] = [f"word_{w}" for w in words]
+    return doc_to_tokens
+
+
+@click.command()
+@click.option("--n-docs", default=2000, type=int)
+@click.option("--doc-length", default=200, type=int)
+@click.option("--vocab-size", default=5000, type=int)
+@click.option("--k", default=100, type=int)
+@click.option("--n-iter", default=10, type=int)
+@click.option("--sampler", default="sparse")
+@click.option("--backend", default="numba")
+@click.option("--max-jobs", default=os.cpu_count(), type=int)
+def main(n_docs, doc_length, vocab_size, k, n_iter, sampler, backend, max_jobs):
+    print("Generating corpus... ", end="")
+    doc_to_tokens = generate_corpus(n_docs, doc_length, vocab_size, k)
+    n_tokens = n_docs * doc_length
+    print(f"Done. {n_tokens} tokens")
+
+    # Compile the kernel outside of the timings
+    lda = LatentDirichletAllocation(doc_to_tokens, K=k, verbose=False, random_state=0)
+    lda.fit(n_iter=1, sampler=sampler, backend=backend)
+
+    n_jobs_grid = [1]
+    while n_jobs_grid[-1] * 2 <= max_jobs:
+        n_jobs_grid.append(n_jobs_grid[-1] * 2)
+
+    serial_time = None
+    print(f"{'n_jobs':>6} {'time (s)':>9} {'tokens/s':>12} {'speedup':>8} {'efficiency':>10}")
+    for n_jobs in n_jobs_grid:
+        lda = LatentDirichletAllocation(doc_to_tokens, K=k, verbose=False, random_state=0)
+        t0 = perf_counter()
+        lda.fit(n_iter=n_iter, sampler=sampler, backend=backend, n_jobs=n_jobs)
+        elapsed = perf_counter() - t0
+        if serial_time is None:
+            serial_time = elapsed
+        speedup = serial_time / elapsed
+        print(
+            f"{n_jobs:>6} {elapsed:>9.2f} {n_tokens * n_iter / elapsed:>12.0f} "
+            f"{speedup:>8.2f} {speedup / n_jobs:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
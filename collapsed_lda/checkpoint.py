@@ -0,0 +1,51 @@
+"""Checkpoints of a running Gibbs sampler.
+
+A checkpoint is a single uncompressed .npz archive holding the arrays of the sampler state next to a JSON document with
+everything else (hyperparameters, RNG state, iteration, settings). Arrays are streamed into the archive in chunks
+rather than copied, and the archive is written next to its destination and then renamed over it, so an interrupted
+write never leaves a corrupt checkpoint behind.
+"""
+import json
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+_METADATA_KEY = "__metadata__"
+
+
+def save_checkpoint(path, arrays: Dict[str, np.ndarray], metadata: dict):
+    """Atomically write a checkpoint
+
+    :param path: Destination of the checkpoint. Replaced if it exists
+    :param arrays: Arrays to store, by name
+    :param metadata: JSON serializable information to store along with the arrays
+    """
+    path = os.fspath(path)
+    metadata = {"format_version": FORMAT_VERSION, **metadata}
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **{_METADATA_KEY: np.array(json.dumps(metadata))}, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Read a checkpoint written by save_checkpoint
+
+    :param path: Path of the checkpoint
+    :return: The stored arrays by name, and the metadata
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        metadata = json.loads(str(archive[_METADATA_KEY]))
+        arrays = {name: archive[name] for name in archive.files if name != _METADATA_KEY}
+
+    if metadata["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported checkpoint format version {metadata['format_version']}, "
+            f"expected {FORMAT_VERSION}"
+        )
+    return arrays, metadata
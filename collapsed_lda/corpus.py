@@ -0,0 +1,143 @@
+from typing import Dict, Hashable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from collapsed_lda.utility.utility import get_unique_words
+
+
+class Corpus:
+    """Integer-encoded corpus stored in a flat, CSR-style layout.
+
+    The tokens of every document are concatenated into a single contiguous array of word ids, such that the tokens
+    of document d are token_ids[doc_offsets[d]:doc_offsets[d + 1]]. The topic currently assigned to each token is kept
+    in the matching flat array topics.
+    """
+
+    def __init__(
+        self,
+        doc_ids: Sequence[Hashable],
+        vocabulary: Sequence[str],
+        token_ids: np.ndarray,
+        doc_offsets: np.ndarray,
+    ):
+        self.doc_ids = list(doc_ids)
+        self.vocabulary = list(vocabulary)
+        self.word_to_id = {word: i for i, word in enumerate(self.vocabulary)}
+        self.token_ids = np.ascontiguousarray(token_ids, dtype=np.int32)
+        self.doc_offsets = np.ascontiguousarray(doc_offsets, dtype=np.int64)
+        self.topics = np.zeros(len(self.token_ids), dtype=np.int32)
+
+    @classmethod
+    def from_documents(
+        cls, doc_to_tokens: Dict[Hashable, List[str]], vocabulary: Optional[Sequence[str]] = None
+    ) -> "Corpus":
+        """Encode a dictionary of tokenized documents
+
+        :param doc_to_tokens: Dictionary mapping document identifiers (titles) to their tokens
+        :param vocabulary: Ordered vocabulary to encode against. Defaults to the sorted unique words of the corpus
+        :return: The encoded corpus
+        """
+        if vocabulary is None:
+            vocabulary = sorted(get_unique_words(doc_to_tokens.values()))
+        word_to_id = {word: i for i, word in enumerate(vocabulary)}
+
+        doc_lengths = np.fromiter(
+            (len(tokens) for tokens in doc_to_tokens.values()),
+            dtype=np.int64,
+            count=len(doc_to_tokens),
+        )
+        doc_offsets = np.zeros(len(doc_to_tokens) + 1, dtype=np.int64)
+        np.cumsum(doc_lengths, out=doc_offsets[1:])
+
+        token_ids = np.fromiter(
+            (word_to_id[word] for tokens in doc_to_tokens.values() for word in tokens),
+            dtype=np.int32,
+            count=doc_offsets[-1],
+        )
+        return cls(doc_to_tokens.keys(), vocabulary, token_ids, doc_offsets)
+
+    def add_documents(self, doc_to_tokens: Dict[Hashable, List[str]]) -> List[str]:
+        """Append documents to the corpus. Words not yet in the vocabulary are appended to it in sorted order, so the
+        ids of known words do not change. The topics of the new tokens are set to 0
+
+        :param doc_to_tokens: Dictionary mapping identifiers (titles) of the new documents to their tokens
+        :return: The new words
+        """
+        duplicates = set(self.doc_ids).intersection(doc_to_tokens)
+        if duplicates:
+            raise ValueError(f"Documents already in the corpus: {sorted(map(str, duplicates))}")
+
+        new_words = sorted(
+            set(get_unique_words(doc_to_tokens.values())).difference(self.word_to_id)
+        )
+        self.vocabulary.extend(new_words)
+        self.word_to_id.update((word, i) for i, word in enumerate(new_words, len(self.word_to_id)))
+
+        new_corpus = Corpus.from_documents(doc_to_tokens, self.vocabulary)
+        self.doc_ids.extend(new_corpus.doc_ids)
+        self.token_ids = np.concatenate((self.token_ids, new_corpus.token_ids))
+        self.doc_offsets = np.concatenate(
+            (self.doc_offsets, self.doc_offsets[-1] + new_corpus.doc_offsets[1:])
+        )
+        self.topics = np.concatenate((self.topics, new_corpus.topics))
+        return new_words
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def n_words(self) -> int:
+        return len(self.vocabulary)
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.token_ids)
+
+    @property
+    def doc_lengths(self) -> np.ndarray:
+        return np.diff(self.doc_offsets)
+
+    def document(self, d: int) -> np.ndarray:
+        """Word ids of the d-th document (a view into token_ids)"""
+        return self.token_ids[self.doc_offsets[d] : self.doc_offsets[d + 1]]
+
+    def tokens(self, d: int) -> List[str]:
+        """Decode the d-th document back into its string tokens"""
+        return [self.vocabulary[i] for i in self.document(d)]
+
+    def document_view(self, values: np.ndarray) -> "DocumentView":
+        """Per-document view of a flat array aligned with token_ids, e.g. per-token topics"""
+        return DocumentView(self.doc_ids, self.doc_offsets, values)
+
+
+class DocumentView(Mapping):
+    """Read-only mapping from document identifiers to their slice of a flat array aligned with the corpus tokens.
+
+    Nothing is copied until a document is accessed: indexing returns the document's values as a list, view returns
+    them as a NumPy view into the flat array.
+    """
+
+    def __init__(self, doc_ids: Sequence[Hashable], doc_offsets: np.ndarray, values: np.ndarray):
+        """
+        :param doc_ids: Identifiers of the documents
+        :param doc_offsets: CSR offsets of each document into values
+        :param values: Flat array with one entry per token
+        """
+        self._doc_index = {doc: d for d, doc in enumerate(doc_ids)}
+        self._doc_offsets = doc_offsets
+        self.values = values
+
+    def view(self, doc: Hashable) -> np.ndarray:
+        """Values of a document, as a view into the flat array"""
+        d = self._doc_index[doc]
+        return self.values[self._doc_offsets[d] : self._doc_offsets[d + 1]]
+
+    def __getitem__(self, doc: Hashable) -> List[int]:
+        return self.view(doc).tolist()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._doc_index)
+
+    def __len__(self) -> int:
+        return len(self._doc_index)
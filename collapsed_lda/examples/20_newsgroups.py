@@ -6,7 +6,9 @@ from sklearn.datasets import fetch_20newsgroups
 from spacy.lang.en.stop_words import STOP_WORDS
 
 from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.utility.spacy_pipeline import preprocess_spacy_docs
 from collapsed_lda.utility.utility import *
+from collapsed_lda.vocabulary import Vocabulary
 
 
 @click.command()
@@ -14,7 +16,11 @@ from collapsed_lda.utility.utility import *
 @click.option("--k", default=20, type=int)
 @click.option("--alpha", default=2 / 20, type=float)
 @click.option("--n-iter", type=int, default=10)
-def main(fast_dev_run, k, alpha, n_iter):
+@click.option("--n-jobs", type=int, default=1, help="Number of spaCy processes")
+@click.option(
+    "--cache-dir", default=None, help="Directory caching the spaCy processing between runs"
+)
+def main(fast_dev_run, k, alpha, n_iter, n_jobs, cache_dir):
     print("Loading data from 20 newsgroups dataset... ", end="")
     dataset = fetch_20newsgroups(
         shuffle=True, random_state=1, remove=("headers", "footers", "quotes")
@@ -25,36 +31,25 @@ def main(fast_dev_run, k, alpha, n_iter):
     print(f"Done. Loaded {len(dataset.data)} items")
 
     # Remove empty / white space documents
-    non_empty_data = [
-        article for article in dataset["data"] if article and not article.isspace()
-    ]
+    non_empty_data = [article for article in dataset["data"] if article and not article.isspace()]
 
-    # Process the articles with spaCy (tokenization only needed)
+    # Process the articles with spaCy, removing the stop words and lemmatizing
     nlp = spacy.load("en_core_web_sm", disable=["parser", "textcat", "ner"])
+    STOP_WORDS.update(["think", "know", "people", "like", "thing", "good", "use", "come"])
     print("Running spaCy processing")
-    id_to_tokens = {i: nlp(article) for i, article in tqdm(enumerate(non_empty_data))}
-    print("Done processing")
-
-    # Remove the stop words and lemmatize
-    STOP_WORDS.update(
-        ["think", "know", "people", "like", "thing", "good", "use", "come"]
+    lemmas = preprocess_spacy_docs(
+        non_empty_data, nlp, STOP_WORDS, n_jobs=n_jobs, cache_dir=cache_dir
     )
-    id_to_tokens = {
-        i: preprocess_spacy_doc(article, STOP_WORDS)
-        for i, article in id_to_tokens.items()
-    }
-
-    unique_words = set().union(*id_to_tokens.values())
-    vocabulary = list(unique_words)
+    id_to_tokens = dict(enumerate(lemmas))
+    print("Done processing")
 
-    # Remove rare and overly common words from corpus
-    filtered_tokens = filter_extremes(id_to_tokens.values(), vocabulary, more_than=10)
-    id_to_filtered = {i: tokens for i, tokens in enumerate(filtered_tokens)}
+    # Remove rare words from corpus, keeping words that occur more than 10 times
+    corpus = Vocabulary(min_count=11).fit_transform(id_to_tokens)
 
     # Run LDA
     print("RUNNING LDA")
     start_time = perf_counter()
-    lda = LatentDirichletAllocation(doc_to_tokens=id_to_filtered, K=k, alpha=alpha)
+    lda = LatentDirichletAllocation(doc_to_tokens=corpus, K=k, alpha=alpha)
     lda.fit(n_iter=n_iter)
     end_time = perf_counter()
     print(f"Done in {(end_time - start_time):.2f}")
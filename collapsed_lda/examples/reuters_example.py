@@ -1,41 +1,49 @@
+import os
 from time import perf_counter
 
 import click
 
 from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.utility.normalization_cache import NormalizationCache
+from collapsed_lda.utility.preprocessor import Preprocessor
+from collapsed_lda.utility.reuters import DEFAULT_PATTERN, iter_reuters
 from collapsed_lda.utility.utility import *
 
 
 @click.command()
 @click.option(
     "--data-path",
-    default="data/reuters21578/reut2-000.sgm",
-    help="Path to reuters data file (.sgm)",
+    default=DEFAULT_PATTERN,
+    help="Glob pattern of the reuters data files (.sgm)",
 )
-def main(data_path):
-    with open(data_path) as f:
-        data = f.read()
-
-    titles_to_articles = parse_sgm_file(data)
-    titles_to_tokens = {
-        title: tokenize_doc(doc) for title, doc in titles_to_articles.items()
+@click.option(
+    "--n-jobs", default=1, type=int, help="Number of parsing and preprocessing processes"
+)
+@click.option(
+    "--stem-cache", default=None, help="Path of a stem cache (.json), reused between runs"
+)
+def main(data_path, n_jobs, stem_cache):
+    # Key articles by NEWID, titles are not unique
+    ids_to_articles = {
+        newid: body for newid, title, body in iter_reuters(data_path, n_jobs=n_jobs) if title
     }
 
+    # Tokenize, remove stop words and stem
+    cache = (
+        NormalizationCache.load(stem_cache) if stem_cache and os.path.exists(stem_cache) else None
+    )
+    preprocessor = Preprocessor(extra_words=["reuter", "said", "also", "would"], stem_cache=cache)
+    ids_to_tokens = preprocessor.process_many(ids_to_articles, n_jobs=n_jobs)
+    if stem_cache:
+        preprocessor.stem_cache.save(stem_cache)
+
     # Remove articles whose content is 'blah blah blah'
-    extra_words = ["reuter", "said", "also", "would"]
-    titles_to_tokens = {
-        title: remove_stop_words(tokens, extra_words=extra_words)
-        for title, tokens in titles_to_tokens.items()
-        if "blah" not in tokens
-    }
-    titles_to_tokens_stem = {
-        title: stem_tokens(tokens) for title, tokens in titles_to_tokens.items()
+    ids_to_tokens_stem = {
+        newid: tokens for newid, tokens in ids_to_tokens.items() if "blah" not in tokens
     }
 
     t0 = perf_counter()
-    lda = LatentDirichletAllocation(
-        doc_to_tokens=titles_to_tokens_stem, K=5, alpha=2 / 5, beta=0.01
-    )
+    lda = LatentDirichletAllocation(doc_to_tokens=ids_to_tokens_stem, K=5, alpha=2 / 5, beta=0.01)
     lda.fit(n_iter=10)
     t1 = perf_counter()
     print(f"Done in {t1 - t0:.3f} seconds")
@@ -0,0 +1,161 @@
+"""Fold-in inference of the topic mixtures of unseen documents.
+
+With the topic word distributions phi of a fitted model held fixed, documents no longer interact, and the topic of
+each token is drawn from
+
+    p(z_i = k) ∝ (n_dk + alpha) * phi[k, w_i]
+
+The first sweep adds the tokens of a document one at a time, each drawn given the tokens before it, and theta is
+estimated from the mean document topic counts over the sweeps after burn-in. Documents are processed in batches, each
+with its own seed, so results do not depend on how batches are spread over processes.
+"""
+import multiprocessing
+
+import numpy as np
+
+from collapsed_lda.samplers import BACKENDS, _inverse_cdf, compile_kernel
+
+# Per-process state of pool workers, set up once by _init_worker
+_worker = {}
+
+
+def fold_in_kernel(token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, uniforms, sum_n_dk):
+    """Run the fold-in chain of every document, one document at a time
+
+    :param token_ids: Flat array of word ids of the documents
+    :param doc_offsets: CSR offsets of each document into token_ids
+    :param phi_wk: Array of shape (W, K), the transposed phi matrix
+    :param alpha: Symmetric Dirichlet prior on document topic mixtures
+    :param n_iter: Number of sweeps, including the initial one
+    :param burn_in: Number of leading sweeps left out of sum_n_dk
+    :param uniforms: Uniform draws on [0, 1), n_iter per token. The draw of token i in sweep s is
+        uniforms[s * n_tokens + i]
+    :param sum_n_dk: Array of shape (D, K) to which the topic counts after every sweep past burn-in are added
+    """
+    n_tokens = token_ids.shape[0]
+    K = phi_wk.shape[1]
+    n_dk = np.zeros(K)
+    cumulative = np.empty(K)
+    topics = np.empty(n_tokens, dtype=np.int64)
+
+    for d in range(doc_offsets.shape[0] - 1):
+        n_dk[:] = 0.0
+        for s in range(n_iter):
+            for i in range(doc_offsets[d], doc_offsets[d + 1]):
+                word = token_ids[i]
+                if s > 0:
+                    n_dk[topics[i]] -= 1
+
+                total = 0.0
+                for k in range(K):
+                    total += (n_dk[k] + alpha) * phi_wk[word, k]
+                    cumulative[k] = total
+
+                new_topic = _inverse_cdf(cumulative, uniforms[s * n_tokens + i])
+                topics[i] = new_topic
+                n_dk[new_topic] += 1
+
+            if s >= burn_in:
+                for k in range(K):
+                    sum_n_dk[d, k] += n_dk[k]
+
+
+def fold_in_vectorized(token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, uniforms, sum_n_dk):
+    """Same as fold_in_kernel, but with array operations across documents: in every sweep, the p-th tokens of all
+    documents are drawn at once, for p = 0, 1, ... Gives the same draws as fold_in_kernel
+    """
+    n_tokens = token_ids.shape[0]
+    n_docs = doc_offsets.shape[0] - 1
+    K = phi_wk.shape[1]
+    n_dk = np.zeros((n_docs, K))
+    topics = np.empty(n_tokens, dtype=np.int64)
+
+    # With documents ordered from longest to shortest, the ones having a p-th token are a prefix of the order
+    doc_lengths = np.diff(doc_offsets)
+    order = np.argsort(-doc_lengths, kind="stable")
+    n_active = np.searchsorted(
+        -doc_lengths[order], -np.arange(doc_lengths.max(initial=0)), side="left"
+    )
+
+    for s in range(n_iter):
+        for p, n in enumerate(n_active):
+            docs = order[:n]
+            idx = doc_offsets[docs] + p
+            if s > 0:
+                n_dk[docs, topics[idx]] -= 1
+
+            cumulative = np.cumsum((n_dk[docs] + alpha) * phi_wk[token_ids[idx]], axis=1)
+            u = uniforms[s * n_tokens + idx] * cumulative[:, -1]
+            new_topics = np.minimum((cumulative <= u[:, None]).sum(axis=1), K - 1)
+            topics[idx] = new_topics
+            n_dk[docs, new_topics] += 1
+
+        if s >= burn_in:
+            sum_n_dk += n_dk
+
+
+def fold_in(token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, seed, backend="python"):
+    """Estimate the topic mixtures of a batch of documents
+
+    :param token_ids: Flat array of word ids of the documents
+    :param doc_offsets: CSR offsets of each document into token_ids
+    :param phi_wk: Array of shape (W, K), the transposed phi matrix
+    :param alpha: Symmetric Dirichlet prior on document topic mixtures
+    :param n_iter: Number of sweeps, including the initial one
+    :param burn_in: Number of leading sweeps discarded
+    :param seed: Seed of the uniforms driving the chains
+    :param backend: "python" runs fold_in_vectorized, "numba" runs fold_in_kernel JIT-compiled
+    :return: Array of shape (D, K) holding the topic mixture of every document. Empty documents get a uniform mixture
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {list(BACKENDS)}")
+    n_docs, K = doc_offsets.shape[0] - 1, phi_wk.shape[1]
+
+    uniforms = np.random.default_rng(seed).random(n_iter * token_ids.shape[0])
+    sum_n_dk = np.zeros((n_docs, K))
+    if backend == "python":
+        fold_in_vectorized(
+            token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, uniforms, sum_n_dk
+        )
+    else:
+        kernel = compile_kernel(fold_in_kernel, backend)
+        kernel(token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, uniforms, sum_n_dk)
+
+    mean_n_dk = sum_n_dk / (n_iter - burn_in)
+    return (mean_n_dk + alpha) / (np.diff(doc_offsets)[:, None] + K * alpha)
+
+
+def fold_in_batches(batches, phi_wk, alpha, n_iter, burn_in, seeds, backend="python", n_jobs=1):
+    """Run fold_in over batches of documents, optionally across a pool of worker processes
+
+    :param batches: List of (token_ids, doc_offsets) per batch
+    :param seeds: Seed per batch
+    :param n_jobs: Number of worker processes. phi is sent to each worker once
+    :return: Topic mixtures of the documents of all batches, in order
+    """
+    if n_jobs == 1:
+        thetas = [
+            fold_in(token_ids, doc_offsets, phi_wk, alpha, n_iter, burn_in, seed, backend)
+            for (token_ids, doc_offsets), seed in zip(batches, seeds)
+        ]
+    else:
+        with multiprocessing.Pool(
+            n_jobs, initializer=_init_worker, initargs=(phi_wk, alpha, n_iter, burn_in, backend)
+        ) as pool:
+            thetas = pool.starmap(
+                _fold_in_batch,
+                [
+                    (token_ids, doc_offsets, seed)
+                    for (token_ids, doc_offsets), seed in zip(batches, seeds)
+                ],
+            )
+    return np.concatenate(thetas) if thetas else np.zeros((0, phi_wk.shape[1]))
+
+
+def _init_worker(phi_wk, alpha, n_iter, burn_in, backend):
+    """Hand a pool worker the frozen model"""
+    _worker.update(phi_wk=phi_wk, alpha=alpha, n_iter=n_iter, burn_in=burn_in, backend=backend)
+
+
+def _fold_in_batch(token_ids, doc_offsets, seed):
+    return fold_in(token_ids, doc_offsets, seed=seed, **_worker)
@@ -1,226 +1,910 @@
-from collections import Counter
-from random import choices
-from statistics import mode
+import os
+from contextlib import nullcontext
+from time import perf_counter
 from typing import Dict, List
 
 import numpy as np
+from scipy.special import gammaln
 from tqdm import trange
 
-from collapsed_lda.utility.utility import get_unique_words
+from collapsed_lda.checkpoint import load_checkpoint, save_checkpoint
+from collapsed_lda.corpus import Corpus
+from collapsed_lda.inference import fold_in_batches
+from collapsed_lda.parallel import ParallelSweeper
+from collapsed_lda.persistence import load_model, save_model
+from collapsed_lda.samplers import compile_kernel, get_sampler, initialize_sweep
+from collapsed_lda.tally import TopicTally
 
 
 class LatentDirichletAllocation:
-    def __init__(self, doc_to_tokens, K, alpha=None, beta=0.01, verbose=True):
-        self.iden_to_tokens = doc_to_tokens
+    def __init__(
+        self,
+        doc_to_tokens,
+        K,
+        alpha=None,
+        beta=0.01,
+        verbose=True,
+        count_dtype=np.int32,
+        random_state=None,
+        estimate_dtype=np.float64,
+    ):
+        """
+        :param doc_to_tokens: Dictionary mapping document identifiers (titles) to their tokens, or an encoded Corpus
+        :param K: Number of latent topics
+        :param alpha: Symmetric Dirichlet prior on document topic mixtures. Defaults to 2 / K
+        :param beta: Symmetric Dirichlet prior on topic word distributions
+        :param verbose: Should progress be printed?
+        :param count_dtype: Integer dtype of the n_dk and n_wk count matrices, e.g. np.uint16 to halve their memory
+            when no word or document count can exceed 65535. The K topic totals are always kept as int64
+        :param random_state: Seed or np.random.Generator driving topic initialization and sampling
+        :param estimate_dtype: Float dtype of phi_matrix and theta_matrix, e.g. np.float32 to halve their memory
+        """
+        count_dtype = np.dtype(count_dtype)
+        if count_dtype.kind not in "iu":
+            raise ValueError(f"count_dtype must be an integer dtype, got {count_dtype}")
+
+        if isinstance(doc_to_tokens, Corpus):
+            self.corpus = doc_to_tokens
+        else:
+            self.corpus = Corpus.from_documents(doc_to_tokens)
         self.K = K
         if alpha is None:
             alpha = 2 / K
         self.alpha = alpha
         self.beta = beta
-        self.vocabulary = sorted(get_unique_words(doc_to_tokens.values()))
-        self.W = len(self.vocabulary)
-        self.theta_matrix = np.zeros((K, len(doc_to_tokens)))
-        self.phi_matrix = np.zeros((K, self.W))
+        self.vocabulary = self.corpus.vocabulary
+        self.W = self.corpus.n_words
+        self.estimate_dtype = np.dtype(estimate_dtype)
+        self._top_n_cache = {}
+        # Set by fit, partial_fit and load
+        self._fitted = False
+        self._phi_wk = None
+        self.theta_matrix = np.zeros((K, self.corpus.n_docs), dtype=self.estimate_dtype)
+        self.phi_matrix = np.zeros((K, self.W), dtype=self.estimate_dtype)
+        self.token_topics = np.zeros(0, dtype=np.int32)
+        self.document_word_topics = {}
         self.verbose = verbose
+        self.count_dtype = count_dtype
+        self._rng = np.random.default_rng(random_state)
 
-    def fit(self, n_iter):
+    def fit(
+        self,
+        n_iter,
+        sampler="vectorized",
+        backend="python",
+        sampler_options=None,
+        n_jobs=1,
+        burn_in=None,
+        thin=1,
+        eval_every=10,
+        tol=None,
+        patience=3,
+        time_budget=None,
+        checkpoint_path=None,
+        checkpoint_every=None,
+        init="random",
+        compute_theta=True,
+        track_modes=True,
+    ):
         """Perform collapsed Gibbs sampling to discover latent topics in corpus
 
         :param n_iter: Number of iterations to run the Gibbs sampler for
+        :param sampler: How each token's topic is drawn. "vectorized" (the default) evaluates all K topics with array
+            operations, "standard" evaluates Eq. 1 one topic at a time, which is only fast with the numba backend and
+            otherwise serves as the reference implementation (both give identical draws), "fastlda" is the exact sampler
+            of Porteous et al. which usually only needs to evaluate a few topics, "sparse" is the exact bucket sampler
+            of Yao et al. which mostly only touches the topics present in the current document and word, "ftree" is an
+            exact sampler drawing from an F+tree of the word-dependent term in O(log K), "alias" is an
+            approximate Metropolis-Hastings sampler with alias-table proposals whose cost per token does not grow with K
+        :param backend: "python" runs the sweep interpreted (reference implementation), "numba" runs each sweep as a
+            single JIT-compiled kernel. Requires numba to be installed
+        :param sampler_options: Sampler specific settings, e.g. {"mh_steps": 4, "rebuild_every": 500} for "alias"
+        :param n_jobs: Number of worker processes. With more than 1, documents are split across a process pool and
+            sampled with approximate distributed LDA (AD-LDA), see collapsed_lda.parallel. -1 uses all CPUs
+        :param burn_in: Number of leading states of the Markov chain (the random initialization, followed by one state
+            per iteration) that are discarded. The remaining states are samples. None (the default) keeps every state
+            for the topic modes, but estimates phi / theta from the final state only
+        :param thin: Only keep every thin-th state after burn-in as a sample. The topic of each token is the mode of
+            its samples. If burn_in is set, phi / theta are estimated from the mean counts over the samples (excluding
+            the random initialization), i.e. they approximate posterior means
+        :param eval_every: Compute the joint log-likelihood log p(w, z) every eval_every iterations and record it in
+            history_. None disables the evaluation
+        :param tol: Stop early once the log-likelihood has improved by less than tol (relative to its best value so
+            far) for patience evaluations in a row. None never stops early
+        :param patience: Number of consecutive evaluations without sufficient improvement before stopping
+        :param time_budget: Stop after the first iteration ending more than time_budget seconds after sampling started
+        :param checkpoint_path: File the state of the sampler is saved to every checkpoint_every iterations, see
+            LatentDirichletAllocation.resume
+        :param checkpoint_every: Number of iterations between checkpoints
+        :param init: How the initial topic of every token is drawn. "random" draws it uniformly, "incremental" adds the
+            tokens one at a time, each drawn from Eq. 1 given the tokens added before. A previously fitted model, or a
+            (phi_matrix, vocabulary) pair of one, draws it from its word-only conditional p(k | w) ∝ phi[k, w], which
+            warm-starts retraining on a slowly changing corpus
+        :param compute_theta: Should theta_matrix be estimated? If not, it is set to None and the document topic
+            counts are not averaged, saving the memory of two dense D x K float arrays when only phi is needed
+        :param track_modes: Should the topic of every token be the mode of its samples (see TopicTally)? If not,
+            token_topics and document_word_topics hold the topics of the final state, and no tally is kept
         """
+        if burn_in is not None and not 0 <= burn_in <= n_iter:
+            raise ValueError(f"burn_in must be between 0 and n_iter ({n_iter}), got {burn_in}")
+        if thin < 1:
+            raise ValueError(f"thin must be at least 1, got {thin}")
+        if tol is not None and eval_every is None:
+            raise ValueError("Early stopping on tol requires eval_every")
+        if (checkpoint_path is None) != (checkpoint_every is None):
+            raise ValueError("checkpoint_path and checkpoint_every must be given together")
+
+        settings = {
+            "n_iter": n_iter,
+            "sampler": sampler,
+            "backend": backend,
+            "sampler_options": sampler_options or {},
+            "n_jobs": n_jobs,
+            "burn_in": burn_in,
+            "thin": thin,
+            "eval_every": eval_every,
+            "tol": tol,
+            "patience": patience,
+            "time_budget": time_budget,
+            "checkpoint_path": None if checkpoint_path is None else os.fspath(checkpoint_path),
+            "checkpoint_every": checkpoint_every,
+            "compute_theta": compute_theta,
+            "track_modes": track_modes,
+        }
 
-        (
-            document_word_topics_MC,
-            document_topic_counts,
-            word_topic_counts,
-            total_topic_counts,
-        ) = self._initialize_topics()
+        self.n_dk, self.n_wk, self.n_k = self._initialize_topics(init, backend)
+
+        # Rather than the whole chain, only keep a running tally of the sampled topics of each token and running sums
+        # of the sampled counts
+        n_samples = (n_iter - (burn_in or 0)) // thin + 1
+        average = burn_in is not None
+        state = {
+            "topic_tally": self._new_topic_tally(n_samples) if track_modes else None,
+            "sum_n_dk": np.zeros(self.n_dk.shape) if average and compute_theta else None,
+            "sum_n_wk": np.zeros(self.n_wk.shape) if average else None,
+            "sum_n_k": np.zeros(self.n_k.shape) if average else None,
+            "n_summed": 0,
+            "best_log_likelihood": -np.inf,
+            "n_stalled": 0,
+            "elapsed": 0.0,
+        }
+        if not burn_in and track_modes:
+            self._update_topic_tally(state["topic_tally"], 0)
+
+        self.history_ = {"iteration": [], "log_likelihood": [], "elapsed": []}
+        self.n_iter_ = 0
 
         if self.verbose:
             print(f"Running LDA for {n_iter} iterations...")
 
-        for j in trange(n_iter):  # One iteration of Gibbs sampler
-            for doc, words in self.iden_to_tokens.items():
-                for word_idx, word in enumerate(words):
-                    densities = np.zeros(self.K)
-                    curr_topic = document_word_topics_MC[doc][word_idx][
-                        -1
-                    ]  # Get most recent topic of MC chain
-
-                    # Calculate probability that a given latent topic z_ij belongs to topic k for each k
-                    for k in range(self.K):
-                        # Relevant counts needed for computation - see paragraph before Eq. 1
-                        N_kj = document_topic_counts[doc][k]
-                        N_wk = word_topic_counts[word][k]
-                        N_k = total_topic_counts[k]
-
-                        # New draw is conditioned on everything BUT this observation
-                        if curr_topic == k:
-                            N_kj -= 1
-                            N_wk -= 1
-                            N_k -= 1
-
-                        # Eq. 1
-                        a_kj = N_kj + self.alpha
-                        b_wk = (N_wk + self.beta) / (N_k + self.W * self.beta)
-                        densities[k] = a_kj * b_wk
-
-                    # Draw a new topic and append to MC - normalization not needed
-                    new_topic = choices(range(self.K), weights=densities)[0]
-                    document_word_topics_MC[doc][word_idx].append(new_topic)
-
-                    # No need to update counts if topic is the same
-                    if new_topic == curr_topic:
-                        continue
-
-                    # Update counts
-                    document_topic_counts[doc][curr_topic] -= 1
-                    document_topic_counts[doc][new_topic] += 1
-
-                    word_topic_counts[word][curr_topic] -= 1
-                    word_topic_counts[word][new_topic] += 1
-
-                    total_topic_counts[curr_topic] -= 1
-                    total_topic_counts[new_topic] += 1
-
-        # Determine topic for word from the chain
-        self._compute_MC_topic_approx(document_word_topics_MC)
-
-        # Estimate other model parameters we are interested in
-        self._compute_phi_estimates(word_topic_counts, total_topic_counts)
-        self._compute_theta_estimates(document_topic_counts)
-
-    def _compute_phi_estimates(
+        self._run_chain(settings, state)
+
+    @classmethod
+    def resume(cls, path) -> "LatentDirichletAllocation":
+        """Continue a fit from a checkpoint written by it, with the settings the fit was started with. The resumed
+        chain is identical to the one an uninterrupted fit would have run, except for sampler specific caches (the
+        alias tables of the "alias" sampler), which are rebuilt.
+
+        :param path: Path of the checkpoint
+        :return: The fitted model
+        """
+        arrays, metadata = load_checkpoint(path)
+
+        corpus = Corpus(
+            metadata["doc_ids"], metadata["vocabulary"], arrays["token_ids"], arrays["doc_offsets"]
+        )
+        corpus.topics = arrays["topics"]
+        lda = cls(
+            corpus,
+            K=metadata["K"],
+            alpha=metadata["alpha"],
+            beta=metadata["beta"],
+            verbose=metadata["verbose"],
+            count_dtype=metadata["count_dtype"],
+            estimate_dtype=metadata["estimate_dtype"],
+        )
+        bit_generator = getattr(np.random, metadata["rng_state"]["bit_generator"])()
+        bit_generator.state = metadata["rng_state"]
+        lda._rng = np.random.Generator(bit_generator)
+
+        lda.n_dk, lda.n_wk, lda.n_k = arrays["n_dk"], arrays["n_wk"], arrays["n_k"]
+        lda.history_ = metadata["history"]
+        lda.n_iter_ = metadata["iteration"]
+        settings = metadata["settings"]
+        n_samples = (settings["n_iter"] - (settings["burn_in"] or 0)) // settings["thin"] + 1
+        state = {
+            "topic_tally": (
+                TopicTally.from_arrays(arrays, "topic_tally_", lda.K, n_samples)
+                if settings["track_modes"]
+                else None
+            ),
+            "sum_n_dk": arrays.get("sum_n_dk"),
+            "sum_n_wk": arrays.get("sum_n_wk"),
+            "sum_n_k": arrays.get("sum_n_k"),
+            **metadata["state"],
+        }
+
+        if lda.verbose:
+            print(f"Resuming LDA at iteration {lda.n_iter_}...")
+
+        lda._run_chain(settings, state)
+        return lda
+
+    def save(self, path):
+        """Save the fitted model for inference (transform, get_top_n_words), see collapsed_lda.persistence. The corpus
+        and sampler state are not saved: use the checkpoints of fit to continue sampling later
+
+        :param path: Directory to save the model to
+        """
+        save_model(
+            path,
+            # Saved in column-major order, so a memory-mapped phi_matrix.T is contiguous for transform
+            arrays={
+                "phi_matrix": np.asfortranarray(self.phi_matrix),
+                **({} if self.theta_matrix is None else {"theta_matrix": self.theta_matrix}),
+            },
+            lists={"vocabulary": self.vocabulary, "doc_ids": self.corpus.doc_ids},
+            manifest={
+                "K": self.K,
+                "alpha": self.alpha,
+                "beta": self.beta,
+                "count_dtype": self.count_dtype.str,
+            },
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True, verbose=True, random_state=None) -> "LatentDirichletAllocation":
+        """Load a model saved with save
+
+        :param path: Directory of the model
+        :param mmap: Should phi_matrix and theta_matrix be memory-mapped read-only rather than read into memory?
+        :param verbose: Should progress be printed?
+        :param random_state: Seed or np.random.Generator driving inference
+        :return: The model. Its corpus holds the vocabulary and document identifiers, but no tokens. theta_matrix is
+            None if it was not estimated
+        """
+        arrays, lists, manifest = load_model(path, mmap=mmap)
+
+        doc_ids = lists["doc_ids"]
+        corpus = Corpus(doc_ids, lists["vocabulary"], np.zeros(0), np.zeros(len(doc_ids) + 1))
+        lda = cls(
+            corpus,
+            K=manifest["K"],
+            alpha=manifest["alpha"],
+            beta=manifest["beta"],
+            verbose=verbose,
+            count_dtype=manifest["count_dtype"],
+            random_state=random_state,
+            estimate_dtype=arrays["phi_matrix"].dtype,
+        )
+        lda.phi_matrix = arrays["phi_matrix"]
+        lda.theta_matrix = arrays.get("theta_matrix")
+        lda._fitted = True
+        return lda
+
+    def _run_chain(self, settings, state):
+        """Run the Gibbs sampler from iteration n_iter_ on and compute the final estimates
+
+        :param settings: Arguments of fit
+        :param state: Running statistics of the chain, updated in place
+        """
+        n_iter, thin = settings["n_iter"], settings["thin"]
+        # Without burn_in, every state is tallied but only the final one is estimated from
+        burn_in = settings["burn_in"] or 0
+        eval_every, tol = settings["eval_every"], settings["tol"]
+        time_budget, checkpoint_every = settings["time_budget"], settings["checkpoint_every"]
+        topic_tally = state["topic_tally"]
+
+        n_jobs = settings["n_jobs"]
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+
+        gibbs_sampler = get_sampler(
+            settings["sampler"],
+            self.alpha,
+            self.beta,
+            backend=settings["backend"],
+            **settings["sampler_options"],
+        )
+
+        if n_jobs > 1:
+            parallel = ParallelSweeper(
+                self, n_jobs, settings["sampler"], settings["backend"], settings["sampler_options"]
+            )
+        else:
+            parallel = nullcontext()
+
+        start = perf_counter() - state["elapsed"]
+        with parallel:
+            progress = trange(self.n_iter_, n_iter)
+            for j in progress:  # One iteration of Gibbs sampler
+                if n_jobs > 1:
+                    parallel.sweep(self._rng)
+                else:
+                    self._sweep(gibbs_sampler)
+                self.n_iter_ = j + 1
+
+                sample, offset = divmod(j + 1 - burn_in, thin)
+                if sample >= 0 and offset == 0:
+                    if topic_tally is not None:
+                        self._update_topic_tally(topic_tally, sample)
+                    if state["sum_n_wk"] is not None:
+                        if state["sum_n_dk"] is not None:
+                            state["sum_n_dk"] += self.n_dk
+                        state["sum_n_wk"] += self.n_wk
+                        state["sum_n_k"] += self.n_k
+                        state["n_summed"] += 1
+
+                elapsed = perf_counter() - start
+                state["elapsed"] = elapsed
+                converged = False
+                if eval_every is not None and (j + 1) % eval_every == 0:
+                    log_likelihood = self.log_likelihood()
+                    self.history_["iteration"].append(j + 1)
+                    self.history_["log_likelihood"].append(log_likelihood)
+                    self.history_["elapsed"].append(elapsed)
+                    progress.set_postfix(log_likelihood=log_likelihood)
+
+                    if tol is not None:
+                        best_log_likelihood = state["best_log_likelihood"]
+                        if log_likelihood - best_log_likelihood < tol * abs(best_log_likelihood):
+                            state["n_stalled"] += 1
+                        else:
+                            state["n_stalled"] = 0
+                        state["best_log_likelihood"] = max(best_log_likelihood, log_likelihood)
+                        converged = state["n_stalled"] >= settings["patience"]
+
+                if checkpoint_every is not None and (j + 1) % checkpoint_every == 0:
+                    self._write_checkpoint(settings, state)
+
+                if converged:
+                    if self.verbose:
+                        print(f"Converged after {j + 1} iterations")
+                    break
+                if time_budget is not None and elapsed > time_budget:
+                    if self.verbose:
+                        print(f"Time budget exhausted after {j + 1} iterations")
+                    break
+
+        if topic_tally is None:
+            self.token_topics = self.corpus.topics.astype(np.int32)
+            self.document_word_topics = self.corpus.document_view(self.token_topics)
+        else:
+            # When stopped before burn-in ended, fall back to the final state
+            if self.n_iter_ < burn_in:
+                self._update_topic_tally(topic_tally, 0)
+
+            # Determine topic for word from the chain
+            self._compute_MC_topic_approx(topic_tally)
+
+        # Estimate other model parameters we are interested in, from the final counts if no sweep was averaged
+        sum_n_dk, sum_n_wk, sum_n_k, n_summed = (
+            state["sum_n_dk"],
+            state["sum_n_wk"],
+            state["sum_n_k"],
+            state["n_summed"],
+        )
+        if n_summed == 0:
+            sum_n_dk, sum_n_wk, sum_n_k, n_summed = self.n_dk, self.n_wk, self.n_k, 1
+        self._compute_phi_estimates(sum_n_wk / n_summed, sum_n_k / n_summed)
+        if settings["compute_theta"]:
+            self._compute_theta_estimates(sum_n_dk / n_summed)
+        else:
+            self.theta_matrix = None
+        self._fitted = True
+
+    def _write_checkpoint(self, settings, state):
+        """Save everything needed to resume the chain after the current iteration, see save_checkpoint"""
+        arrays = {
+            "token_ids": self.corpus.token_ids,
+            "doc_offsets": self.corpus.doc_offsets,
+            "topics": self.corpus.topics,
+            "n_dk": self.n_dk,
+            "n_wk": self.n_wk,
+            "n_k": self.n_k,
+            **(
+                {}
+                if state["topic_tally"] is None
+                else state["topic_tally"].to_arrays("topic_tally_")
+            ),
+            "sum_n_dk": state["sum_n_dk"],
+            "sum_n_wk": state["sum_n_wk"],
+            "sum_n_k": state["sum_n_k"],
+        }
+        arrays = {name: array for name, array in arrays.items() if array is not None}
+        metadata = {
+            "K": self.K,
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "verbose": self.verbose,
+            "count_dtype": self.count_dtype.str,
+            "estimate_dtype": self.estimate_dtype.str,
+            "doc_ids": self.corpus.doc_ids,
+            "vocabulary": self.corpus.vocabulary,
+            "rng_state": self._rng.bit_generator.state,
+            "iteration": self.n_iter_,
+            "history": self.history_,
+            "settings": settings,
+            "state": {
+                name: value
+                for name, value in state.items()
+                if name not in arrays and name != "topic_tally"
+            },
+        }
+        save_checkpoint(settings["checkpoint_path"], arrays, metadata)
+
+    def log_likelihood(self) -> float:
+        """Compute the joint log-likelihood log p(w, z) of the corpus and the current topic assignments, with phi and
+        theta integrated out (Eq. 2 and 3 of Griffiths & Steyvers)
+
+        :return: The log-likelihood
+        """
+        K, W, D = self.K, self.W, self.corpus.n_docs
+        alpha, beta = self.alpha, self.beta
+
+        log_p_w_given_z = (
+            K * (gammaln(W * beta) - W * gammaln(beta))
+            + gammaln(self.n_wk + beta).sum()
+            - gammaln(self.n_k + W * beta).sum()
+        )
+        log_p_z = (
+            D * (gammaln(K * alpha) - K * gammaln(alpha))
+            + gammaln(self.n_dk + alpha).sum()
+            - gammaln(self.corpus.doc_lengths + K * alpha).sum()
+        )
+        return float(log_p_w_given_z + log_p_z)
+
+    def transform(
+        self, docs, n_iter=20, burn_in=5, batch_size=1000, backend="python", n_jobs=1
+    ) -> np.ndarray:
+        """Infer the topic mixtures of unseen documents by fold-in Gibbs sampling against the fitted phi matrix, see
+        collapsed_lda.inference. Words outside of the model's vocabulary are dropped
+
+        :param docs: Dictionary mapping document identifiers (titles) to their tokens, or a list of token lists
+        :param n_iter: Number of sweeps over every document, including the initial one
+        :param burn_in: Number of leading sweeps left out of the estimates
+        :param batch_size: Number of documents sampled together
+        :param backend: "python" runs the chains of a batch vectorized across documents, "numba" runs a JIT-compiled
+            kernel. Requires numba to be installed
+        :param n_jobs: Number of worker processes the batches are spread over. -1 uses all CPUs
+        :return: Array of shape (K, number of documents), laid out like theta_matrix
+        """
+        if not self._fitted:
+            raise ValueError("The model must be fitted before calling transform")
+        if not 0 <= burn_in < n_iter:
+            raise ValueError(
+                f"burn_in must be between 0 and n_iter - 1 ({n_iter - 1}), got {burn_in}"
+            )
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+
+        token_lists = list(docs.values()) if isinstance(docs, dict) else list(docs)
+        word_to_id = self.corpus.word_to_id
+        batches = []
+        for b in range(0, len(token_lists), batch_size):
+            ids = [
+                [word_to_id[word] for word in tokens if word in word_to_id]
+                for tokens in token_lists[b : b + batch_size]
+            ]
+            doc_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+            np.cumsum([len(doc_ids) for doc_ids in ids], out=doc_offsets[1:])
+            token_ids = np.fromiter(
+                (i for doc_ids in ids for i in doc_ids), dtype=np.int32, count=doc_offsets[-1]
+            )
+            batches.append((token_ids, doc_offsets))
+
+        seeds = self._rng.integers(np.iinfo(np.int64).max, size=len(batches))
+        if self._phi_wk is None:
+            # A view of a memory-mapped phi_matrix, which is saved in column-major order
+            self._phi_wk = np.ascontiguousarray(self.phi_matrix.T)
+        theta = fold_in_batches(
+            batches,
+            self._phi_wk,
+            self.alpha,
+            n_iter,
+            burn_in,
+            seeds,
+            backend=backend,
+            n_jobs=n_jobs,
+        )
+        return theta.T
+
+    def partial_fit(
         self,
-        word_topic_counts: Dict[str, Dict[int, int]],
-        total_topic_counts: Dict[int, int],
+        new_docs,
+        n_iter,
+        sampler="vectorized",
+        backend="python",
+        sampler_options=None,
+        rejuvenation=0.0,
     ):
+        """Add documents to a fitted model and sample the topics of their tokens, leaving the topics of the other
+        documents as they are. Words not yet in the vocabulary are added to it. The new tokens are initialized one at a
+        time from the current posterior (Eq. 1 given all tokens added before), after which only the new documents are
+        swept. phi and theta are then estimated from the mean counts over these sweeps
+
+        :param new_docs: Dictionary mapping identifiers (titles) of the new documents to their tokens
+        :param n_iter: Number of iterations to run the Gibbs sampler for
+        :param sampler: Name of the sampler, see fit
+        :param backend: Backend of the sampler, see fit
+        :param sampler_options: Sampler specific settings, see fit
+        :param rejuvenation: Fraction of the previous documents, drawn anew every iteration, that are swept along with
+            the new ones. Their topics in document_word_topics are not updated
+        """
+        if not hasattr(self, "n_dk"):
+            raise ValueError("The model must be fitted before calling partial_fit")
+        if not 0 <= rejuvenation <= 1:
+            raise ValueError(f"rejuvenation must be between 0 and 1, got {rejuvenation}")
+
+        corpus = self.corpus
+        first_doc, first_token = corpus.n_docs, corpus.n_tokens
+        new_words = corpus.add_documents(new_docs)
+        self.W = corpus.n_words
+        new_doc_idx = np.arange(first_doc, corpus.n_docs)
+
+        # New documents and words start without any counts
+        self.n_dk = np.concatenate(
+            (self.n_dk, np.zeros((len(new_doc_idx), self.K), dtype=self.count_dtype))
+        )
+        self.n_wk = np.concatenate(
+            (self.n_wk, np.zeros((len(new_words), self.K), dtype=self.count_dtype))
+        )
+
+        gibbs_sampler = get_sampler(
+            sampler, self.alpha, self.beta, backend=backend, **(sampler_options or {})
+        )
+
+        if self.verbose:
+            print(f"Adding {len(new_doc_idx)} documents and {len(new_words)} words...")
+        initialize = compile_kernel(initialize_sweep, backend)
+        initialize(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            new_doc_idx,
+            corpus.topics,
+            self.n_dk,
+            self.n_wk,
+            self.n_k,
+            self.alpha,
+            self.beta,
+            self._rng.random(corpus.n_tokens - first_token),
+        )
+
+        topic_tally = self._new_topic_tally(n_iter + 1, first_doc)
+        self._update_topic_tally(topic_tally, 0)
+        sum_n_dk = np.zeros(self.n_dk.shape)
+        sum_n_wk = np.zeros(self.n_wk.shape)
+        sum_n_k = np.zeros(self.n_k.shape)
+
+        if self.verbose:
+            print(f"Running LDA on the new documents for {n_iter} iterations...")
+
+        n_rejuvenated = round(rejuvenation * first_doc)
+        for j in trange(n_iter):
+            docs = new_doc_idx
+            if n_rejuvenated:
+                old_docs = self._rng.choice(first_doc, size=n_rejuvenated, replace=False)
+                docs = np.concatenate((np.sort(old_docs), new_doc_idx))
+            self._sweep(gibbs_sampler, docs)
+
+            self._update_topic_tally(topic_tally, j + 1)
+            sum_n_dk += self.n_dk
+            sum_n_wk += self.n_wk
+            sum_n_k += self.n_k
+
+        self._compute_MC_topic_approx(topic_tally, first_doc)
+
+        if n_iter == 0:
+            sum_n_dk, sum_n_wk, sum_n_k, n_iter = self.n_dk, self.n_wk, self.n_k, 1
+        self._compute_phi_estimates(sum_n_wk / n_iter, sum_n_k / n_iter)
+        self._compute_theta_estimates(sum_n_dk / n_iter)
+        self._fitted = True
+
+    def _sweep(self, gibbs_sampler, docs=None):
+        """Run one serial sweep of the sampler over the given documents, by default the whole corpus"""
+        corpus = self.corpus
+        if docs is None:
+            docs = np.arange(corpus.n_docs)
+            n_tokens = corpus.n_tokens
+        else:
+            n_tokens = corpus.doc_lengths[docs].sum()
+        uniforms = self._rng.random(n_tokens * gibbs_sampler.uniforms_per_token)
+        gibbs_sampler.sweep(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            docs,
+            corpus.topics,
+            self.n_dk,
+            self.n_wk,
+            self.n_k,
+            uniforms,
+        )
+
+    def _compute_phi_estimates(self, n_wk: np.ndarray, n_k: np.ndarray):
         """Compute estimate of the phi matrix. The phi matrix captures word distributions per topic, such that
 
             phi[i, j] = probability mass of word j in topic i
 
         Equation given at the end of section 3 of Porteous et al.
 
-        :param word_topic_counts: Dictionary that maps words to their respective counts per topic
-        :param total_topic_counts: Dictionary that maps each topic to the number of times it appears in corpus
+        :param n_wk: Array of shape (W, K) counting (on average over samples) the number of times each word is assigned
+            to each topic
+        :param n_k: Array of shape (K,) counting (on average over samples) the number of times each topic appears in
+            corpus
         :returns: Array of shape (K, V), such that the phi[i, j] = probability mass of word j in token i
         """
+        phi_matrix = n_wk.T.astype(self.estimate_dtype)
+        phi_matrix += self.beta
+        phi_matrix /= (n_k + self.W * self.beta).astype(self.estimate_dtype)[:, None]
+        self.phi_matrix = phi_matrix
 
-        for word_idx, word in enumerate(self.vocabulary):
-            for topic_idx in range(self.K):
-                N_wk = word_topic_counts[word][topic_idx]
-                N_k = total_topic_counts[topic_idx]
-
-                self.phi_matrix[topic_idx, word_idx] = (N_wk + self.beta) / (
-                    N_k + self.W * self.beta
-                )
-
-    def _compute_theta_estimates(
-        self, document_topic_counts: Dict[str, Dict[int, int]]
-    ):
+    def _compute_theta_estimates(self, n_dk: np.ndarray):
         """Compute estimate of the theta matrix. The theta matrix captures the topic mixtures of each document, such that:
 
             theta[i, j] = Topic mixture of topic i in document j
 
         Equation given at the end of section 3 of Porteous et al.
 
-        :param document_topic_counts: A dictionary mapping titles to topic counts in that document
+        :param n_dk: Array of shape (D, K) counting (on average over samples) the number of tokens assigned to each
+            topic per document
         """
-        for j, (doc, topics) in enumerate(document_topic_counts.items()):
-            for topic_idx in topics:
-                N_kj = document_topic_counts[doc][topic_idx]
-                N_j = sum(document_topic_counts[doc].values())
-                self.theta_matrix[topic_idx, j] = (N_kj + self.alpha) / (
-                    N_j + self.K * self.alpha
-                )
+        N_j = n_dk.sum(axis=1)
+        theta_matrix = n_dk.T.astype(self.estimate_dtype)
+        theta_matrix += self.alpha
+        theta_matrix /= (N_j + self.K * self.alpha).astype(self.estimate_dtype)
+        self.theta_matrix = theta_matrix
 
-    def _initialize_topics(self):
+    def _initialize_topics(self, init="random", backend="python"):
         """
-        Randomly initialize topic / word count information needed for sampling
+        Initialize topic / word count information needed for sampling. The initial topic of every token is written to
+        the corpus' flat topic assignment array
 
-        :return: 4 dictionaries of counts (see comments below)
+        :param init: How the initial topics are drawn, see fit
+        :param backend: Backend running the "incremental" initializer
+        :return: The 3 count arrays n_dk, n_wk and n_k (see _count_topics)
         """
         if self.verbose:
             print("Initializing topics...")
 
-        # Contains the ordered list of topics for each document (Dict of lists)
-        document_word_topics_MC = {}
-
-        # Counts of each topic per document (Dict of dicts)
-        document_topic_counts = {
-            title: Counter() for title in self.iden_to_tokens.keys()
-        }
+        if isinstance(init, LatentDirichletAllocation):
+            topics = self._draw_topics_from_phi(init.phi_matrix, init.vocabulary)
+        elif isinstance(init, tuple):
+            topics = self._draw_topics_from_phi(*init)
+        elif init == "random":
+            # Start with randomly assigned topics - one per token in the corpus
+            topics = self._rng.integers(low=0, high=self.K, size=self.corpus.n_tokens)
+        elif init == "incremental":
+            corpus = self.corpus
+            n_dk = np.zeros((corpus.n_docs, self.K), dtype=self.count_dtype)
+            n_wk = np.zeros((self.W, self.K), dtype=self.count_dtype)
+            n_k = np.zeros(self.K, dtype=np.int64)
+            initialize = compile_kernel(initialize_sweep, backend)
+            initialize(
+                corpus.token_ids,
+                corpus.doc_offsets,
+                np.arange(corpus.n_docs),
+                corpus.topics,
+                n_dk,
+                n_wk,
+                n_k,
+                self.alpha,
+                self.beta,
+                self._rng.random(corpus.n_tokens),
+            )
+            return n_dk, n_wk, n_k
+        else:
+            raise ValueError(
+                f"Unknown init '{init}', expected 'random', 'incremental', a fitted model or a "
+                "(phi_matrix, vocabulary) pair"
+            )
+
+        self.corpus.topics[:] = topics
+        return self._count_topics(topics)
+
+    def _draw_topics_from_phi(self, phi_matrix: np.ndarray, vocabulary: List[str]) -> np.ndarray:
+        """Draw the topic of every token from its word-only conditional p(k | w) ∝ phi[k, w] under a previous model.
+        Tokens of words missing from the previous vocabulary get a uniformly drawn topic
+
+        :param phi_matrix: Array of shape (K, V) of the previous model
+        :param vocabulary: The V words of the previous model
+        :return: Flat array of topics, aligned with the corpus token array
+        """
+        if phi_matrix.shape != (self.K, len(vocabulary)):
+            raise ValueError(
+                f"Expected a phi matrix of shape ({self.K}, {len(vocabulary)}), got {phi_matrix.shape}"
+            )
+
+        # Word-only conditional of every word of this corpus, uniform for unknown ones
+        conditionals = np.ones((self.W, self.K))
+        previous_ids = {word: i for i, word in enumerate(vocabulary)}
+        known = np.array([word in previous_ids for word in self.vocabulary], dtype=bool)
+        known_ids = [previous_ids[word] for word in self.vocabulary if word in previous_ids]
+        conditionals[known] = phi_matrix[:, known_ids].T
+        cumulative = np.cumsum(conditionals, axis=1)
+        cumulative /= cumulative[:, -1:]
+
+        # Offsetting the cumulative distribution of word w by w lets a single search draw every token
+        cumulative += np.arange(self.W)[:, None]
+        token_ids = self.corpus.token_ids
+        u = token_ids + self._rng.random(self.corpus.n_tokens)
+        flat_idx = np.searchsorted(cumulative.ravel(), u, side="right")
+        return np.minimum(flat_idx - token_ids.astype(np.int64) * self.K, self.K - 1)
+
+    def _count_topics(self, topics: np.ndarray):
+        """Tally topic assignments of the corpus into the dense count arrays used by the sampler
+
+        :param topics: Flat array of topic assignments, aligned with the corpus token array
+        :return: Counts of each topic per document (D x K), per word (W x K) and across all documents (K)
+        """
+        doc_idx = np.repeat(np.arange(self.corpus.n_docs), self.corpus.doc_lengths)
+        n_dk = np.bincount(doc_idx * self.K + topics, minlength=self.corpus.n_docs * self.K)
+        n_wk = np.bincount(
+            self.corpus.token_ids.astype(np.int64) * self.K + topics, minlength=self.W * self.K
+        )
+        n_k = np.bincount(topics, minlength=self.K)
 
-        # Counts number of times a given word is assigned to each topic (dict of dicts)
-        word_topic_counts = {word: Counter() for word in self.vocabulary}
+        return (
+            n_dk.reshape(self.corpus.n_docs, self.K).astype(self.count_dtype),
+            n_wk.reshape(self.W, self.K).astype(self.count_dtype),
+            n_k,
+        )
 
-        # Counts of each topic across all documents
-        total_topic_counts = Counter()
+    def _new_topic_tally(self, n_samples: int, first_doc: int = 0) -> TopicTally:
+        """Create the running tally from which the mode of every token's Markov chain is read, see TopicTally
 
-        for doc, words in self.iden_to_tokens.items():
-            # Start with randomly assigned topics - update appropriate counts
-            topics = np.random.randint(low=0, high=self.K, size=len(words))
-            document_word_topics_MC[doc] = [[topic] for topic in topics]
-            document_topic_counts[doc].update(topics)
-            total_topic_counts.update(topics)
+        :param n_samples: Number of states of each chain that will be tallied
+        :param first_doc: Only tally the tokens of the documents from first_doc on
+        :return: Empty tally, aligned with the corpus token array from document first_doc on
+        """
+        n_tokens = self.corpus.n_tokens - self.corpus.doc_offsets[first_doc]
+        return TopicTally(n_tokens, self.K, n_samples)
 
-            # Update the topic counts per word
-            for unique_word in set(words):
-                unique_word_topics = [
-                    topic
-                    for idx, topic in enumerate(topics)
-                    if words[idx] == unique_word
-                ]
-                word_topic_counts[unique_word].update(unique_word_topics)
+    def _update_topic_tally(self, topic_tally: TopicTally, sample: int):
+        """Add the current topic assignments of the corpus to the running tally
 
-        return (
-            document_word_topics_MC,
-            document_topic_counts,
-            word_topic_counts,
-            total_topic_counts,
-        )
+        :param topic_tally: Tally created by _new_topic_tally
+        :param sample: Index of the current state among the tallied states of the chain
+        """
+        first_token = self.corpus.n_tokens - topic_tally.n_tokens
+        topic_tally.update(self.corpus.topics[first_token:], sample)
 
-    def _compute_MC_topic_approx(self, document_word_topics_MC):
-        """Given a Markov chain of word topics, compute a Monte Carlo approximation by picking mode of topics. If 2 or
-        more topics are tied in highest frequency, pick the one which occurs first.
+    def _compute_MC_topic_approx(self, topic_tally: TopicTally, first_doc: int = 0):
+        """Given the tallied Markov chain of word topics, compute a Monte Carlo approximation by picking mode of topics.
+        If 2 or more topics are tied in highest frequency, pick the one which occurs first. The modes are stored in
+        token_topics, a flat array aligned with the corpus token array, and viewed per document in
+        document_word_topics, which maps identifiers (titles) to the Monte Carlo approx of their topics
 
-        :param document_word_topics_MC: Dictionary that maps identifiers (titles) to a Markov chain of their topics
-        :return: Dictionary that maps identifiers (titles) to the Monte Carlo approx of their topics (mode)
+        :param topic_tally: Tally of the topics of every token, see _new_topic_tally
+        :param first_doc: First document covered by the tally. Modes of earlier documents are kept
         """
+        most_frequent_topics = topic_tally.modes()
+        first_token = self.corpus.doc_offsets[first_doc]
+        self.token_topics = np.concatenate((self.token_topics[:first_token], most_frequent_topics))
+        self.document_word_topics = self.corpus.document_view(self.token_topics)
+
+    @property
+    def phi_matrix(self) -> np.ndarray:
+        """Array of shape (K, W) holding the word distribution of every topic. Assigning it clears the cached rankings
+        of top_words and the (W, K) layout used by transform, changing it in place does not"""
+        return self._phi_matrix
+
+    @phi_matrix.setter
+    def phi_matrix(self, phi_matrix: np.ndarray):
+        self._phi_matrix = phi_matrix
+        self._phi_wk = None
+        self._top_n_cache = {
+            key: value for key, value in self._top_n_cache.items() if key[0] != "words"
+        }
 
-        document_word_topics = {title: [] for title in document_word_topics_MC.keys()}
+    @property
+    def theta_matrix(self) -> np.ndarray:
+        """Array of shape (K, D) holding the topic mixture of every document. Assigning it clears the cached rankings
+        of top_documents, changing it in place does not"""
+        return self._theta_matrix
+
+    @theta_matrix.setter
+    def theta_matrix(self, theta_matrix: np.ndarray):
+        self._theta_matrix = theta_matrix
+        self._top_n_cache = {
+            key: value for key, value in self._top_n_cache.items() if key[0] != "docs"
+        }
 
-        # Iterate through all chains in all documents
-        for doc, word_chains in document_word_topics_MC.items():
-            # Iterate through chains within individual documents
-            for word_chain in word_chains:
-                most_frequent_topic = mode(word_chain)
-                document_word_topics[doc].append(most_frequent_topic)
+    def top_words(self, n: int, relevance_lambda=1.0, return_probs=False) -> Dict[int, List]:
+        """Find the top n words of every topic, ranked by their relevance (Sievert & Shirley, 2014)
 
-        self.document_word_topics = document_word_topics
+            relevance(w, k) = lambda * log(phi[k, w]) + (1 - lambda) * log(phi[k, w] / p(w))
 
-    def get_top_n_words(self, n: int, return_probs=False) -> Dict[int, List]:
-        """
-        Calculate the top n words with highest posterior probability for every topic
+        where p(w) is the marginal probability of word w, weighting topics by their share of the corpus tokens (equally
+        for a loaded model). lambda = 1 ranks by phi alone, lower values favour words specific to the topic. Rankings
+        are cached until phi_matrix is reassigned, and a cached ranking of at least n words is reused
 
         :param n: Top number of words to find
-        :param return_probs: Should we return probabilities with these words?
+        :param relevance_lambda: Weight lambda between 0 and 1 of the topic probability against the lift
+        :param return_probs: Should we return (word, phi[k, w]) pairs rather than words?
         :return: A dictionary mapping topics to the respective top words
         """
-        topic_top_words = {}
-
-        for k, topic_word_distribution in enumerate(self.phi_matrix):
-            # Find the top probability indices, then take the first n of them
-            top_n_idx = np.argsort(topic_word_distribution)[::-1][:n]
-            top_n_words = [self.vocabulary[i] for i in top_n_idx]
+        if not 0 <= relevance_lambda <= 1:
+            raise ValueError(f"relevance_lambda must be between 0 and 1, got {relevance_lambda}")
+
+        def relevance():
+            if relevance_lambda == 1:
+                return self.phi_matrix
+            if hasattr(self, "n_k"):
+                topic_weights = self.n_k / self.n_k.sum()
+            else:
+                topic_weights = np.full(self.K, 1 / self.K)
+            log_phi = np.log(self.phi_matrix)
+            log_p_w = np.log(topic_weights @ self.phi_matrix)
+            return log_phi - (1 - relevance_lambda) * log_p_w
 
+        top_idx = self._top_n(("words", relevance_lambda), relevance, n)
+        topic_top_words = {}
+        for k, word_idx in enumerate(top_idx):
+            top_n_words = [self.vocabulary[i] for i in word_idx]
             if return_probs:
-                top_n_probs = self.phi_matrix[k, top_n_idx]
-                top_n_probs = np.around(top_n_probs, 4)
-                topic_top_words[k] = [
-                    (word, prob) for word, prob in zip(top_n_words, top_n_probs)
-                ]
+                topic_top_words[k] = list(zip(top_n_words, self.phi_matrix[k, word_idx].tolist()))
             else:
                 topic_top_words[k] = top_n_words
+        return topic_top_words
+
+    def top_documents(self, topic: int, n: int, return_probs=False) -> List:
+        """Find the n documents with the highest share of a topic. Rankings of all topics are computed at once and
+        cached until theta_matrix is reassigned
+
+        :param topic: Index of the topic
+        :param n: Top number of documents to find
+        :param return_probs: Should we return (document, theta[topic, d]) pairs rather than documents?
+        :return: Identifiers (titles) of the top documents
+        """
+        if self.theta_matrix is None:
+            raise ValueError(
+                "theta_matrix was not computed, see the compute_theta argument of fit"
+            )
+
+        doc_idx = self._top_n(("docs",), lambda: self.theta_matrix, n)[topic]
+        top_n_docs = [self.corpus.doc_ids[d] for d in doc_idx]
+        if return_probs:
+            return list(zip(top_n_docs, self.theta_matrix[topic, doc_idx].tolist()))
+        return top_n_docs
+
+    def _top_n(self, key, scores, n: int) -> np.ndarray:
+        """Column indices of the n highest scores of every row, in decreasing order of score
+
+        :param key: Key of the ranking in the cache
+        :param scores: Callable returning the array of scores of shape (K, M), only called on a cache miss
+        :param n: Number of indices per row
+        :return: Array of shape (K, min(n, M))
+        """
+        # Cached are the top indices of every row and the number of columns of the scores
+        cached = self._top_n_cache.get(key)
+        if cached is None or cached[0].shape[1] < min(n, cached[1]):
+            values = scores()
+            n_top = min(n, values.shape[1])
+            if n_top == 0:
+                top_idx = np.zeros((values.shape[0], 0), dtype=np.intp)
+            else:
+                # Partition the n highest scores of every row to the front, then only sort those
+                top_idx = np.argpartition(-values, n_top - 1, axis=1)[:, :n_top]
+                order = np.argsort(
+                    -np.take_along_axis(values, top_idx, axis=1), axis=1, kind="stable"
+                )
+                top_idx = np.take_along_axis(top_idx, order, axis=1)
+            cached = (top_idx, values.shape[1])
+            self._top_n_cache[key] = cached
+        return cached[0][:, :n]
+
+    def get_top_n_words(self, n: int, return_probs=False) -> Dict[int, List]:
+        """
+        Calculate the top n words with highest posterior probability for every topic
 
+        :param n: Top number of words to find
+        :param return_probs: Should we return probabilities with these words?
+        :return: A dictionary mapping topics to the respective top words
+        """
+        topic_top_words = self.top_words(n, return_probs=return_probs)
+        if return_probs:
+            topic_top_words = {
+                k: [(word, round(prob, 4)) for word, prob in top_n_words]
+                for k, top_n_words in topic_top_words.items()
+            }
         return topic_top_words
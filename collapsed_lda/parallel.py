@@ -0,0 +1,181 @@
+"""Approximate distributed LDA (AD-LDA, Newman et al. 2009) on a local process pool.
+
+Documents are split into one shard per worker. Every iteration, each worker sweeps its shard against a private copy of
+the word-topic counts n_wk / n_k, taken at the start of the iteration, while writing its documents' topics and n_dk in
+place. Only the rows of n_wk of words occurring in the shard are copied, as the others are neither read nor changed.
+The changes the workers made to their copies are then summed into the master counts, with every worker reducing a
+slice of the rows. All arrays live in multiprocessing.shared_memory, so nothing but shard bounds, row slices and seeds
+is pickled per task.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from collapsed_lda.samplers import get_sampler
+
+# Per-process state of pool workers, set up once by _init_worker
+_worker = {}
+
+
+class ParallelSweeper:
+    """Runs AD-LDA sweeps of a LatentDirichletAllocation model across a pool of worker processes
+
+    While the sweeper is open, the model's topic assignments and count arrays are views into shared memory. They are
+    copied back into regular arrays when it is closed.
+    """
+
+    def __init__(self, lda, n_jobs, sampler, backend="python", sampler_options=None):
+        """
+        :param lda: Model whose current topic assignments and counts are swept
+        :param n_jobs: Number of worker processes, each sweeping one shard of documents
+        :param sampler: Name of the sampler run by every worker, see collapsed_lda.samplers
+        :param backend: Backend of the sampler
+        :param sampler_options: Sampler specific settings
+        """
+        self.lda = lda
+        self.n_jobs = n_jobs
+        corpus = lda.corpus
+
+        arrays = {
+            "token_ids": corpus.token_ids,
+            "doc_offsets": corpus.doc_offsets,
+            "topics": corpus.topics,
+            "n_dk": lda.n_dk,
+            "n_wk": lda.n_wk,
+            "n_k": lda.n_k,
+            # Rows of words outside of a shard stay zero, i.e. unchanged
+            "local_n_wk": np.zeros((n_jobs, *lda.n_wk.shape), dtype=lda.n_wk.dtype),
+            "local_n_k": np.zeros((n_jobs, *lda.n_k.shape), dtype=lda.n_k.dtype),
+        }
+        self._blocks = []
+        self._specs = {}
+        self.arrays = {}
+        for name, array in arrays.items():
+            # Zero-sized shared memory blocks are not allowed
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._blocks.append(block)
+            self._specs[name] = (block.name, array.shape, array.dtype.str)
+            self.arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            self.arrays[name][...] = array
+
+        corpus.topics = self.arrays["topics"]
+        lda.n_dk, lda.n_wk, lda.n_k = self.arrays["n_dk"], self.arrays["n_wk"], self.arrays["n_k"]
+
+        self.shards = partition_documents(corpus.doc_offsets, n_jobs)
+        row_bounds = np.linspace(0, lda.n_wk.shape[0], n_jobs + 1).astype(int)
+        self.row_slices = list(zip(row_bounds[:-1].tolist(), row_bounds[1:].tolist()))
+        self._pool = multiprocessing.Pool(
+            n_jobs,
+            initializer=_init_worker,
+            initargs=(self._specs, sampler, lda.alpha, lda.beta, backend, sampler_options or {}),
+        )
+
+    def sweep(self, rng):
+        """Run one AD-LDA iteration over all documents
+
+        :param rng: Generator used to seed the workers' uniforms
+        """
+        seeds = rng.integers(np.iinfo(np.int64).max, size=self.n_jobs)
+        self._pool.starmap(
+            _sweep_shard,
+            [
+                (j, start, end, seed)
+                for j, ((start, end), seed) in enumerate(zip(self.shards, seeds))
+            ],
+        )
+
+        # Workers left the changes they made in their local copies, which they now sum into the master counts
+        self._pool.starmap(_reduce_rows, self.row_slices)
+        self.arrays["n_k"] += self.arrays["local_n_k"].sum(axis=0, dtype=self.arrays["n_k"].dtype)
+
+    def close(self):
+        """Stop the workers and copy the shared state back into regular arrays of the model"""
+        self._pool.terminate()
+        self._pool.join()
+
+        self.lda.corpus.topics = self.arrays["topics"].copy()
+        self.lda.n_dk = self.arrays["n_dk"].copy()
+        self.lda.n_wk = self.arrays["n_wk"].copy()
+        self.lda.n_k = self.arrays["n_k"].copy()
+        self.arrays = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def partition_documents(doc_offsets, n_shards):
+    """Split documents into contiguous shards holding roughly the same number of tokens
+
+    :param doc_offsets: CSR offsets of each document into the flat token array
+    :param n_shards: Number of shards
+    :return: List of (first document, one past the last document) per shard
+    """
+    n_tokens = doc_offsets[-1]
+    targets = np.arange(1, n_shards) * n_tokens / n_shards
+    bounds = np.searchsorted(doc_offsets, targets)
+    bounds = np.concatenate(([0], bounds, [len(doc_offsets) - 1]))
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _init_worker(specs, sampler, alpha, beta, backend, sampler_options):
+    """Attach a pool worker to the shared arrays and create its sampler"""
+    _worker["blocks"] = []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker["blocks"].append(block)
+        _worker[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _worker["sampler"] = get_sampler(sampler, alpha, beta, backend=backend, **sampler_options)
+
+
+def _sweep_shard(j, start, end, seed):
+    """Sweep documents [start, end) against a private copy of the word-topic counts
+
+    Afterwards the copy holds the changes made to it, i.e. the copy minus the master counts.
+    """
+    doc_offsets = _worker["doc_offsets"]
+    # Words of the shard, which is the same for the lifetime of the pool
+    if ("words", j) not in _worker:
+        _worker["words", j] = np.unique(
+            _worker["token_ids"][doc_offsets[start] : doc_offsets[end]]
+        )
+    words = _worker["words", j]
+
+    local_n_wk, local_n_k = _worker["local_n_wk"][j], _worker["local_n_k"][j]
+    local_n_wk[words] = _worker["n_wk"][words]
+    local_n_k[...] = _worker["n_k"]
+
+    gibbs_sampler = _worker["sampler"]
+    # The counts changed since this worker last swept them, as other workers sweep the same shared arrays
+    gibbs_sampler.reset()
+    n_tokens = doc_offsets[end] - doc_offsets[start]
+    uniforms = np.random.default_rng(seed).random(n_tokens * gibbs_sampler.uniforms_per_token)
+    gibbs_sampler.sweep(
+        _worker["token_ids"],
+        doc_offsets,
+        np.arange(start, end),
+        _worker["topics"],
+        _worker["n_dk"],
+        local_n_wk,
+        local_n_k,
+        uniforms,
+    )
+
+    local_n_wk[words] -= _worker["n_wk"][words]
+    np.subtract(local_n_k, _worker["n_k"], out=local_n_k)
+
+
+def _reduce_rows(start, end):
+    """Add the changes of every shard to rows [start, end) of the master word-topic counts
+
+    Unsigned counts wrap around, but the sum is exact modulo 2 ** bits and every final count fits in the dtype.
+    """
+    n_wk = _worker["n_wk"]
+    n_wk[start:end] += _worker["local_n_wk"][:, start:end].sum(axis=0, dtype=n_wk.dtype)
@@ -0,0 +1,129 @@
+"""Storage of fitted models for inference.
+
+A model is saved as a directory holding its matrices as raw .npy files, its vocabulary and document identifiers as
+JSON, and a small JSON manifest with the hyperparameters and format version. Loaded matrices can be memory-mapped
+read-only, which makes loading independent of the model size and lets every process serving the same model share its
+pages.
+
+Files of a saved model are never rewritten, since that would pull the pages from under processes that memory-mapped
+them. Every save instead writes a new version subdirectory of the model path, and then atomically replaces the CURRENT
+file naming the version that is loaded. Processes serving the previous version keep their mappings, and loaders see
+either the previous or the new version, never a partially written one. Versions before the previous one are removed.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+_VERSION_DIR = re.compile(r"v(\d+)$")
+
+
+def save_model(path, arrays: Dict[str, np.ndarray], lists: Dict[str, list], manifest: dict):
+    """Write a new version of a model directory
+
+    :param path: Directory to write to. Created if it does not exist
+    :param arrays: Arrays to save as <name>.npy
+    :param lists: JSON serializable lists to save as <name>.json
+    :param manifest: JSON serializable hyperparameters
+    """
+    os.makedirs(path, exist_ok=True)
+    versions = _list_versions(path)
+    version = f"v{max(versions, default=0) + 1:06d}"
+
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=path)
+    # mkdtemp only lets the owner in, but models are usually served by other users too
+    os.chmod(tmp_dir, 0o755)
+    for name, array in arrays.items():
+        with open(os.path.join(tmp_dir, f"{name}.npy"), "wb") as f:
+            np.save(f, array, allow_pickle=False)
+            _flush(f)
+    for name, values in lists.items():
+        with open(os.path.join(tmp_dir, f"{name}.json"), "w") as f:
+            json.dump(values, f)
+            _flush(f)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "arrays": sorted(arrays),
+        "lists": sorted(lists),
+        **manifest,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+        _flush(f)
+    os.rename(tmp_dir, os.path.join(path, version))
+
+    # Switch loaders over to the new version
+    tmp_current = os.path.join(path, f"{CURRENT}.tmp")
+    with open(tmp_current, "w") as f:
+        f.write(version)
+        _flush(f)
+    os.replace(tmp_current, os.path.join(path, CURRENT))
+
+    # Keep the previous version for loaders that read CURRENT just before it was replaced. Removing files does not
+    # affect processes that memory-mapped them
+    for old in sorted(versions)[:-1]:
+        shutil.rmtree(os.path.join(path, f"v{old:06d}"), ignore_errors=True)
+
+
+def load_model(path, mmap=True) -> Tuple[Dict[str, np.ndarray], Dict[str, list], dict]:
+    """Read the current version of a model directory written by save_model
+
+    :param path: Directory of the model
+    :param mmap: Should the arrays be memory-mapped read-only rather than read into memory?
+    :return: The arrays, the lists and the manifest
+    """
+    path = current_version(path)
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No model manifest found at {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported model format version {manifest['format_version']}, "
+            f"expected {FORMAT_VERSION}"
+        )
+
+    arrays = {
+        name: np.load(
+            os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False
+        )
+        for name in manifest["arrays"]
+    }
+    lists = {}
+    for name in manifest["lists"]:
+        with open(os.path.join(path, f"{name}.json")) as f:
+            lists[name] = json.load(f)
+    return arrays, lists, manifest
+
+
+def current_version(path) -> str:
+    """Directory holding the files of the current version of a model"""
+    current_path = os.path.join(path, CURRENT)
+    if not os.path.exists(current_path):
+        raise FileNotFoundError(f"No saved model found at {path}: {current_path} does not exist")
+    with open(current_path) as f:
+        return os.path.join(path, f.read().strip())
+
+
+def _list_versions(path):
+    """Numbers of the version subdirectories of a model directory"""
+    return [
+        int(match.group(1))
+        for match in map(_VERSION_DIR.match, os.listdir(path))
+        if match is not None
+    ]
+
+
+def _flush(f):
+    """Make sure the contents of f are on disk before the version is published"""
+    f.flush()
+    os.fsync(f.fileno())
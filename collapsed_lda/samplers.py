@@ -0,0 +1,1032 @@
+"""Sweep kernels for collapsed Gibbs sampling.
+
+Every kernel performs one sweep over the documents listed in docs, updating the flat topic assignments and the count
+arrays in place. Randomness is supplied through a pre-generated batch of uniforms which is consumed in token order, so
+that every kernel is a deterministic function of its inputs.
+"""
+import numpy as np
+
+try:
+    from numba.extending import register_jitable
+except ImportError:  # numba is optional - helpers then only ever run interpreted
+
+    def register_jitable(func):
+        return func
+
+
+BACKENDS = ("python", "numba")
+_compiled_kernels = {}
+
+
+def compile_kernel(kernel, backend):
+    """Return the kernel as run by the given backend
+
+    The kernels are written in the subset of Python that Numba understands, so the "python" backend runs them as-is
+    (a slow reference implementation) and the "numba" backend JIT-compiles them into a single nogil function.
+
+    :param kernel: One of the sweep kernels in this module
+    :param backend: Either "python" or "numba"
+    :return: A callable with the same signature as kernel
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {list(BACKENDS)}")
+    if backend == "python":
+        return kernel
+
+    if kernel not in _compiled_kernels:
+        try:
+            import numba
+        except ImportError as e:
+            raise ImportError(
+                "The numba backend requires numba, install it with `pip install numba`"
+            ) from e
+        _compiled_kernels[kernel] = numba.njit(nogil=True, cache=True)(kernel)
+    return _compiled_kernels[kernel]
+
+
+def standard_sweep(token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, alpha, beta, uniforms):
+    """Reference kernel: evaluates Eq. 1 one topic at a time and draws by inverse CDF
+
+    :param token_ids: Flat array of word ids in the corpus
+    :param doc_offsets: CSR offsets of each document into token_ids
+    :param docs: Indices of the documents to sweep over
+    :param topics: Flat array of topic assignments, aligned with token_ids
+    :param n_dk: Array of shape (D, K) counting topic assignments per document
+    :param n_wk: Array of shape (W, K) counting topic assignments per word
+    :param n_k: Array of shape (K,) counting topic assignments across the corpus
+    :param alpha: Symmetric Dirichlet prior on document topic mixtures
+    :param beta: Symmetric Dirichlet prior on topic word distributions
+    :param uniforms: Uniform draws on [0, 1), one per token swept
+    """
+    K = n_k.shape[0]
+    W_beta = n_wk.shape[0] * beta
+    cumulative = np.empty(K)
+    u_idx = 0
+
+    for d in docs:
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            word = token_ids[i]
+            curr_topic = topics[i]
+
+            # New draw is conditioned on everything BUT this observation
+            n_dk[d, curr_topic] -= 1
+            n_wk[word, curr_topic] -= 1
+            n_k[curr_topic] -= 1
+
+            # Eq. 1 - normalization not needed
+            total = 0.0
+            for k in range(K):
+                a_kj = n_dk[d, k] + alpha
+                b_wk = (n_wk[word, k] + beta) / (n_k[k] + W_beta)
+                total += a_kj * b_wk
+                cumulative[k] = total
+
+            new_topic = _inverse_cdf(cumulative, uniforms[u_idx])
+            u_idx += 1
+
+            topics[i] = new_topic
+            n_dk[d, new_topic] += 1
+            n_wk[word, new_topic] += 1
+            n_k[new_topic] += 1
+
+
+def vectorized_sweep(token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, alpha, beta, uniforms):
+    """Computes the full K-vector of Eq. 1 with array operations for every token. Takes the same arguments as
+    standard_sweep and produces identical draws
+    """
+    W_beta = n_wk.shape[0] * beta
+    u_idx = 0
+
+    for d in docs:
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            word = token_ids[i]
+            curr_topic = topics[i]
+
+            n_dk[d, curr_topic] -= 1
+            n_wk[word, curr_topic] -= 1
+            n_k[curr_topic] -= 1
+
+            densities = (n_dk[d] + alpha) * ((n_wk[word] + beta) / (n_k + W_beta))
+            new_topic = _inverse_cdf(np.cumsum(densities), uniforms[u_idx])
+            u_idx += 1
+
+            topics[i] = new_topic
+            n_dk[d, new_topic] += 1
+            n_wk[word, new_topic] += 1
+            n_k[new_topic] += 1
+
+
+def initialize_sweep(token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, alpha, beta, uniforms):
+    """Adds the tokens of docs, which are not yet part of the counts, one at a time: every token is drawn from Eq. 1
+    given the counts so far and then counted. Takes the same arguments as standard_sweep
+    """
+    K = n_k.shape[0]
+    W_beta = n_wk.shape[0] * beta
+    cumulative = np.empty(K)
+    u_idx = 0
+
+    for d in docs:
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            word = token_ids[i]
+
+            total = 0.0
+            for k in range(K):
+                total += (n_dk[d, k] + alpha) * (n_wk[word, k] + beta) / (n_k[k] + W_beta)
+                cumulative[k] = total
+
+            new_topic = _inverse_cdf(cumulative, uniforms[u_idx])
+            u_idx += 1
+
+            topics[i] = new_topic
+            n_dk[d, new_topic] += 1
+            n_wk[word, new_topic] += 1
+            n_k[new_topic] += 1
+
+
+def fastlda_sweep(token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, alpha, beta, uniforms):
+    """FastLDA kernel of Porteous et al. (2008). Takes the same arguments as standard_sweep
+
+    Writing Eq. 1 as p_k = a_k * b_k * c_k with a_k = N_kj + alpha, b_k = N_wk + beta and c_k = 1 / (N_k + W * beta),
+    topics are visited in decreasing order of their count in the document. After visiting l topics the normalization
+    constant is bounded from above by Z_l = s_l + ||a_{>l}||_3 ||b_{>l}||_3 ||c_{>l}||_3 (Hölder), where s_l is the
+    mass visited so far. These bounds shrink towards the exact normalization constant, and a topic can usually be
+    accepted after only a few terms, see _fastlda_draw. The draws are exact.
+    """
+    K = n_k.shape[0]
+    W = n_wk.shape[0]
+    W_beta = W * beta
+
+    # c_k and the sums of cubes needed for the 3-norms, kept up to date as counts change
+    inv_topic = 1 / (n_k + W_beta)
+    topic_cubes = np.sum(inv_topic**3)
+    word_cubes = np.empty(W)
+    for w in range(W):
+        word_cubes[w] = np.sum((n_wk[w] + beta) ** 3)
+
+    order = np.empty(K, dtype=np.int64)
+    position = np.empty(K, dtype=np.int64)
+    probs = np.empty(K)
+    u_idx = 0
+
+    for d in docs:
+        doc_cubes = np.sum((n_dk[d] + alpha) ** 3)
+        # Topics sorted by decreasing count in the document, kept sorted as counts change below
+        order[:] = np.argsort(-n_dk[d].astype(np.int64), kind="mergesort")
+        for l in range(K):
+            position[order[l]] = l
+
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            word = token_ids[i]
+            curr_topic = topics[i]
+
+            doc_cubes -= _cube(n_dk[d, curr_topic] + alpha)
+            word_cubes[word] -= _cube(n_wk[word, curr_topic] + beta)
+            topic_cubes -= _cube(inv_topic[curr_topic])
+            n_dk[d, curr_topic] -= 1
+            n_wk[word, curr_topic] -= 1
+            n_k[curr_topic] -= 1
+            inv_topic[curr_topic] = 1 / (n_k[curr_topic] + W_beta)
+            doc_cubes += _cube(n_dk[d, curr_topic] + alpha)
+            word_cubes[word] += _cube(n_wk[word, curr_topic] + beta)
+            topic_cubes += _cube(inv_topic[curr_topic])
+            _restore_order(order, position, n_dk[d], curr_topic, -1)
+
+            new_topic = _fastlda_draw(
+                order,
+                n_dk[d],
+                n_wk[word],
+                inv_topic,
+                alpha,
+                beta,
+                doc_cubes,
+                word_cubes[word],
+                topic_cubes,
+                uniforms[u_idx],
+                probs,
+            )
+            u_idx += 1
+
+            doc_cubes -= _cube(n_dk[d, new_topic] + alpha)
+            word_cubes[word] -= _cube(n_wk[word, new_topic] + beta)
+            topic_cubes -= _cube(inv_topic[new_topic])
+            topics[i] = new_topic
+            n_dk[d, new_topic] += 1
+            n_wk[word, new_topic] += 1
+            n_k[new_topic] += 1
+            inv_topic[new_topic] = 1 / (n_k[new_topic] + W_beta)
+            doc_cubes += _cube(n_dk[d, new_topic] + alpha)
+            word_cubes[word] += _cube(n_wk[word, new_topic] + beta)
+            topic_cubes += _cube(inv_topic[new_topic])
+            _restore_order(order, position, n_dk[d], new_topic, 1)
+
+
+@register_jitable
+def _fastlda_draw(
+    order,
+    doc_counts,
+    word_counts,
+    inv_topic,
+    alpha,
+    beta,
+    doc_cubes,
+    word_cubes,
+    topic_cubes,
+    u,
+    probs,
+):
+    """Draw a topic with the sequence of shrinking normalization bounds of FastLDA
+
+    With u fixed, the search stops at the first l such that u * Z_l <= s_l, where the sample must be one of the
+    first l topics. If u * Z_l also exceeds s_{l-1}, topic l is returned. Otherwise u fell into mass that was
+    attributed to the unvisited topics under the looser bound Z_{l-1}, and it is redistributed over the first l - 1
+    topics in proportion to their probabilities. Summing over l, topic k is drawn with probability p_k / Z exactly.
+
+    :param order: Topics in the order they are visited
+    :param inv_topic: c_k = 1 / (N_k + W * beta) for every topic
+    :param probs: Scratch space of size K
+    :return: The sampled topic
+    """
+    K = order.shape[0]
+    a_rest, b_rest, c_rest = doc_cubes, word_cubes, topic_cubes
+    mass = 0.0
+    rest = 0.0
+
+    for l in range(K):
+        k = order[l]
+        a = doc_counts[k] + alpha
+        b = word_counts[k] + beta
+        c = inv_topic[k]
+        probs[l] = a * b * c
+
+        prev_mass, prev_rest = mass, rest
+        mass += probs[l]
+        if l < K - 1:
+            a_rest -= a * a * a
+            b_rest -= b * b * b
+            c_rest -= c * c * c
+            # Clip away rounding errors of the running sums
+            rest = max(a_rest, 0.0) * max(b_rest, 0.0) * max(c_rest, 0.0)
+        else:
+            rest = 0.0
+
+        # u * Z_l <= s_l with Z_l = s_l + rest^(1/3), compared in cubes to only take roots once we stop
+        slack = mass * (1 - u)
+        if u * u * u * rest <= slack * slack * slack:
+            bound = mass + np.cbrt(rest)
+            if l == 0 or u * bound > prev_mass:
+                return k
+
+            # u is uniform on (s_{l-1} / Z_{l-1}, s_{l-1} / Z_l] here, rescale it to pick among the first l topics
+            prev_bound = prev_mass + np.cbrt(prev_rest)
+            low, high = prev_mass / prev_bound, prev_mass / bound
+            target = (u - low) / (high - low) * prev_mass if high > low else u * prev_mass
+            cumulative = 0.0
+            for t in range(l):
+                cumulative += probs[t]
+                if target <= cumulative:
+                    return order[t]
+            return order[l - 1]
+
+    return order[K - 1]
+
+
+@register_jitable
+def _restore_order(order, position, counts, topic, delta):
+    """Keep counts[order] sorted in decreasing order after the count of topic changed by delta = +1 or -1
+
+    Only topics tied with the old count of topic are out of place, so topic is swapped with the far end of that block
+    of ties, which is found by binary search.
+    """
+    p = position[topic]
+    # In Python ints, since -1 cannot be cast to unsigned counts
+    old_count = int(counts[topic]) - delta
+    if delta > 0:
+        # First position before p holding a count <= old_count
+        low, high = 0, p
+        while low < high:
+            mid = (low + high) // 2
+            if counts[order[mid]] <= old_count:
+                high = mid
+            else:
+                low = mid + 1
+        q = low
+    else:
+        # Last position after p holding a count >= old_count
+        low, high = p, order.shape[0] - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if counts[order[mid]] >= old_count:
+                low = mid
+            else:
+                high = mid - 1
+        q = low
+
+    other = order[q]
+    order[q], order[p] = topic, other
+    position[topic], position[other] = q, p
+
+
+def sparse_sweep(
+    token_ids,
+    doc_offsets,
+    docs,
+    topics,
+    n_dk,
+    n_wk,
+    n_k,
+    alpha,
+    beta,
+    uniforms,
+    word_topics,
+    word_topic_offsets,
+    word_nnz,
+):
+    """SparseLDA kernel of Yao et al. (2009)
+
+    Eq. 1 is split into three buckets with c_k = 1 / (N_k + W * beta):
+
+        s = sum_k alpha * beta * c_k                      (smoothing, same for every token)
+        r = sum_k N_kj * beta * c_k                       (document, nonzero only for topics in the document)
+        q = sum_k (N_kj + alpha) * c_k * N_wk             (topic-word, nonzero only for topics of the word)
+
+    s and r are cached and updated in O(1) as counts change, q is computed over the nonzero topics of the word. Most
+    draws land in q and only touch the few topics the word is assigned to. The draws are exact. Takes the arguments of
+    standard_sweep, plus the nonzero topics of every word which persist across sweeps, see _nonzero_topics. They are
+    kept sorted, so that the draws only depend on the counts and not on the history of the lists.
+
+    :param word_topics: Nonzero topics of every word, updated in place as topics are added to / removed from the word
+    :param word_topic_offsets: Offsets of the topics of each word into word_topics
+    :param word_nnz: Number of nonzero topics of every word, updated in place
+    """
+    K = n_k.shape[0]
+    W = n_wk.shape[0]
+    W_beta = W * beta
+
+    inv_topic = 1 / (n_k + W_beta)
+    smoothing = alpha * beta * np.sum(inv_topic)
+    # Coefficient of N_wk in q, reset to alpha * c_k for topics outside the current document
+    q_coef = alpha * inv_topic
+
+    doc_topics = np.empty(K, dtype=np.int32)
+    q_terms = np.empty(K)
+    u_idx = 0
+
+    for d in docs:
+        # Nonzero topics of the document and its r bucket
+        doc_nnz = 0
+        doc_mass = 0.0
+        for k in range(K):
+            if n_dk[d, k] > 0:
+                doc_topics[doc_nnz] = k
+                doc_nnz += 1
+                doc_mass += n_dk[d, k] * beta * inv_topic[k]
+                q_coef[k] = (n_dk[d, k] + alpha) * inv_topic[k]
+
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            word = token_ids[i]
+            curr_topic = topics[i]
+            start = word_topic_offsets[word]
+
+            smoothing -= alpha * beta * inv_topic[curr_topic]
+            doc_mass -= n_dk[d, curr_topic] * beta * inv_topic[curr_topic]
+            n_dk[d, curr_topic] -= 1
+            n_wk[word, curr_topic] -= 1
+            n_k[curr_topic] -= 1
+            inv_topic[curr_topic] = 1 / (n_k[curr_topic] + W_beta)
+            smoothing += alpha * beta * inv_topic[curr_topic]
+            doc_mass += n_dk[d, curr_topic] * beta * inv_topic[curr_topic]
+            q_coef[curr_topic] = (n_dk[d, curr_topic] + alpha) * inv_topic[curr_topic]
+            if n_dk[d, curr_topic] == 0:
+                doc_nnz = _remove_topic(doc_topics, doc_nnz, curr_topic)
+            if n_wk[word, curr_topic] == 0:
+                word_nnz[word] = _remove_sorted(word_topics[start:], word_nnz[word], curr_topic)
+
+            # Topic-word bucket over the nonzero topics of the word
+            word_mass = 0.0
+            for t in range(word_nnz[word]):
+                k = word_topics[start + t]
+                word_mass += q_coef[k] * n_wk[word, k]
+                q_terms[t] = word_mass
+
+            x = uniforms[u_idx] * (smoothing + doc_mass + word_mass)
+            u_idx += 1
+            if x < word_mass:
+                new_topic = word_topics[start + word_nnz[word] - 1]
+                for t in range(word_nnz[word]):
+                    if x < q_terms[t]:
+                        new_topic = word_topics[start + t]
+                        break
+            elif doc_nnz > 0 and x < word_mass + doc_mass:
+                x -= word_mass
+                new_topic = doc_topics[doc_nnz - 1]
+                for t in range(doc_nnz):
+                    k = doc_topics[t]
+                    x -= n_dk[d, k] * beta * inv_topic[k]
+                    if x < 0:
+                        new_topic = k
+                        break
+            else:
+                x -= word_mass + doc_mass
+                new_topic = K - 1
+                for k in range(K):
+                    x -= alpha * beta * inv_topic[k]
+                    if x < 0:
+                        new_topic = k
+                        break
+
+            smoothing -= alpha * beta * inv_topic[new_topic]
+            doc_mass -= n_dk[d, new_topic] * beta * inv_topic[new_topic]
+            if n_dk[d, new_topic] == 0:
+                doc_topics[doc_nnz] = new_topic
+                doc_nnz += 1
+            if n_wk[word, new_topic] == 0:
+                word_nnz[word] = _insert_sorted(word_topics[start:], word_nnz[word], new_topic)
+            topics[i] = new_topic
+            n_dk[d, new_topic] += 1
+            n_wk[word, new_topic] += 1
+            n_k[new_topic] += 1
+            inv_topic[new_topic] = 1 / (n_k[new_topic] + W_beta)
+            smoothing += alpha * beta * inv_topic[new_topic]
+            doc_mass += n_dk[d, new_topic] * beta * inv_topic[new_topic]
+            q_coef[new_topic] = (n_dk[d, new_topic] + alpha) * inv_topic[new_topic]
+
+        for t in range(doc_nnz):
+            k = doc_topics[t]
+            q_coef[k] = alpha * inv_topic[k]
+
+
+@register_jitable
+def _remove_topic(topic_list, nnz, topic):
+    """Swap-remove topic from the first nnz entries of topic_list, returning the new number of entries"""
+    for t in range(nnz):
+        if topic_list[t] == topic:
+            topic_list[t] = topic_list[nnz - 1]
+            return nnz - 1
+    return nnz
+
+
+@register_jitable
+def _remove_sorted(topic_list, nnz, topic):
+    """Remove topic from the sorted first nnz entries of topic_list, returning the new number of entries"""
+    t = np.searchsorted(topic_list[:nnz], topic)
+    if t == nnz or topic_list[t] != topic:
+        return nnz
+    for t in range(t, nnz - 1):
+        topic_list[t] = topic_list[t + 1]
+    return nnz - 1
+
+
+@register_jitable
+def _insert_sorted(topic_list, nnz, topic):
+    """Insert topic into the sorted first nnz entries of topic_list, returning the new number of entries"""
+    t = nnz
+    while t > 0 and topic_list[t - 1] > topic:
+        topic_list[t] = topic_list[t - 1]
+        t -= 1
+    topic_list[t] = topic
+    return nnz + 1
+
+
+def _nonzero_topics(counts, rows=None):
+    """Lists of the nonzero topics of rows of a count matrix, for kernels which update them incrementally
+
+    The topics of row r are stored in increasing order in topic_lists[offsets[r]:offsets[r] + nnz[r]]. Each row has
+    room for min(K, total count of the row) topics, which keeps enough room as long as counts only move between topics
+    of a row, as they do during a sweep.
+
+    :param counts: Array of shape (R, K), e.g. n_wk or n_dk
+    :param rows: Sorted rows to list the topics of, e.g. the words of the swept tokens. Other rows get no room. By
+        default every row
+    :return: topic_lists, offsets and nnz
+    """
+    n_rows, K = counts.shape
+    if rows is None:
+        rows = np.arange(n_rows)
+        row_counts = counts
+    else:
+        row_counts = counts[rows]
+    capacity = np.zeros(n_rows, dtype=np.int64)
+    capacity[rows] = np.minimum(row_counts.sum(axis=1, dtype=np.int64), K)
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(capacity, out=offsets[1:])
+
+    nonzero_rows, cols = np.nonzero(row_counts)
+    row_nnz = np.bincount(nonzero_rows, minlength=rows.shape[0])
+    nnz = np.zeros(n_rows, dtype=np.int64)
+    nnz[rows] = row_nnz
+    # Position of every nonzero count within its row
+    ranks = np.arange(nonzero_rows.shape[0]) - (np.cumsum(row_nnz) - row_nnz)[nonzero_rows]
+    topic_lists = np.empty(offsets[-1], dtype=np.int32)
+    topic_lists[offsets[rows[nonzero_rows]] + ranks] = cols
+    return topic_lists, offsets, nnz
+
+
+def _swept_words(token_ids, doc_offsets, docs, W):
+    """Sorted ids of the words occurring in docs"""
+    starts, ends = doc_offsets[docs], doc_offsets[np.asarray(docs) + 1]
+    lengths = ends - starts
+    # Flat indices of the tokens of docs
+    token_idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(
+        lengths.sum()
+    )
+    return np.flatnonzero(np.bincount(token_ids[token_idx], minlength=W))
+
+
+def alias_sweep(
+    token_ids,
+    doc_offsets,
+    docs,
+    topics,
+    n_dk,
+    n_wk,
+    n_k,
+    alpha,
+    beta,
+    uniforms,
+    mh_steps,
+    rebuild_every,
+    alias_prob,
+    alias_idx,
+    proposal,
+    uses,
+):
+    """Metropolis-Hastings kernel with alias-table proposals, in the style of LightLDA / AliasLDA
+
+    Every token runs mh_steps MH steps targeting Eq. 1, cycling between two proposals that can be drawn in O(1):
+
+        word proposal: (N_wk + beta) / (N_k + W * beta), drawn from a per-word alias table that may be stale
+        doc proposal: N_kj + alpha, drawn by picking the topic of a random other token of the document
+
+    Alias tables are rebuilt lazily once they have been used rebuild_every times, so their O(K) construction cost is
+    amortized. As in LightLDA, a rebuilt table includes the current topics of other tokens of the word which are yet to
+    be resampled. This makes the chain slightly approximate, with an error that vanishes as word counts grow. Takes the
+    arguments of standard_sweep, plus the MH settings and the persistent table storage.
+
+    :param uniforms: Uniform draws on [0, 1), 2 * mh_steps per token swept
+    :param mh_steps: Number of MH steps per token
+    :param rebuild_every: Number of draws from a word's alias table before it is rebuilt
+    :param alias_prob: Array of shape (W, K) holding the acceptance probability of every alias table bin
+    :param alias_idx: Array of shape (W, K) holding the alias of every alias table bin
+    :param proposal: Array of shape (W, K) holding the normalized proposal each alias table was built from
+    :param uses: Array of shape (W,) counting the draws from each table since it was built. Negative for tables
+        that were never built
+    """
+    K = n_k.shape[0]
+    W_beta = n_wk.shape[0] * beta
+    weights = np.empty(K)
+    small = np.empty(K, dtype=np.int64)
+    large = np.empty(K, dtype=np.int64)
+    u_idx = 0
+
+    for d in docs:
+        start, end = doc_offsets[d], doc_offsets[d + 1]
+        # Other tokens of the document, excluding the one being sampled
+        n_others = end - start - 1
+
+        for i in range(start, end):
+            word = token_ids[i]
+            topic = topics[i]
+
+            n_dk[d, topic] -= 1
+            n_wk[word, topic] -= 1
+            n_k[topic] -= 1
+
+            for step in range(mh_steps):
+                u, accept = uniforms[u_idx], uniforms[u_idx + 1]
+                u_idx += 2
+
+                if step % 2 == 0:
+                    if uses[word] < 0 or uses[word] >= rebuild_every:
+                        for k in range(K):
+                            weights[k] = (n_wk[word, k] + beta) / (n_k[k] + W_beta)
+                        _build_alias(
+                            weights,
+                            alias_prob[word],
+                            alias_idx[word],
+                            proposal[word],
+                            small,
+                            large,
+                        )
+                        uses[word] = 0
+                    uses[word] += 1
+
+                    # A single uniform picks both the bin and the coin flip within it
+                    x = u * K
+                    column = min(int(x), K - 1)
+                    proposed = (
+                        column
+                        if x - column < alias_prob[word, column]
+                        else alias_idx[word, column]
+                    )
+                    ratio = (
+                        (n_dk[d, proposed] + alpha)
+                        * (n_wk[word, proposed] + beta)
+                        * (n_k[topic] + W_beta)
+                        * proposal[word, topic]
+                    ) / (
+                        (n_dk[d, topic] + alpha)
+                        * (n_wk[word, topic] + beta)
+                        * (n_k[proposed] + W_beta)
+                        * proposal[word, proposed]
+                    )
+                else:
+                    x = u * (n_others + K * alpha)
+                    if x < n_others:
+                        j = start + int(x)
+                        if j >= i:
+                            j += 1
+                        proposed = topics[j]
+                    else:
+                        proposed = min(int((x - n_others) / alpha), K - 1)
+                    # The document term of Eq. 1 cancels with the proposal
+                    ratio = ((n_wk[word, proposed] + beta) * (n_k[topic] + W_beta)) / (
+                        (n_wk[word, topic] + beta) * (n_k[proposed] + W_beta)
+                    )
+
+                if accept < ratio:
+                    topic = proposed
+
+            topics[i] = topic
+            n_dk[d, topic] += 1
+            n_wk[word, topic] += 1
+            n_k[topic] += 1
+
+
+@register_jitable
+def _build_alias(weights, prob, alias, proposal, small, large):
+    """Build a Walker alias table for the unnormalized weights with Vose's method
+
+    :param weights: Unnormalized probabilities of each of the K outcomes
+    :param prob: Output acceptance probability of every bin
+    :param alias: Output alias of every bin
+    :param proposal: Output normalized probabilities of each outcome
+    :param small: Scratch space of size K
+    :param large: Scratch space of size K
+    """
+    K = weights.shape[0]
+    scaled = weights * (K / np.sum(weights))
+    n_small, n_large = 0, 0
+    for k in range(K):
+        proposal[k] = scaled[k] / K
+        if scaled[k] < 1:
+            small[n_small] = k
+            n_small += 1
+        else:
+            large[n_large] = k
+            n_large += 1
+
+    while n_small > 0 and n_large > 0:
+        n_small -= 1
+        n_large -= 1
+        less, more = small[n_small], large[n_large]
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = scaled[more] + scaled[less] - 1
+        if scaled[more] < 1:
+            small[n_small] = more
+            n_small += 1
+        else:
+            large[n_large] = more
+            n_large += 1
+
+    # Leftovers are only off from 1 by rounding errors
+    for t in range(n_large):
+        prob[large[t]] = 1
+        alias[large[t]] = large[t]
+    for t in range(n_small):
+        prob[small[t]] = 1
+        alias[small[t]] = small[t]
+
+
+def ftree_sweep(
+    token_ids,
+    doc_offsets,
+    docs,
+    topics,
+    n_dk,
+    n_wk,
+    n_k,
+    alpha,
+    beta,
+    uniforms,
+    doc_topics,
+    doc_topic_offsets,
+    doc_nnz,
+):
+    """F+tree kernel in the style of F+LDA (Yu et al., 2015)
+
+    Eq. 1 splits into alpha * q_k + N_kj * q_k with q_k = (N_wk + beta) / (N_k + W * beta). Tokens are visited word by
+    word, and the word-dependent q_k of the current word are kept in an F+tree (a binary tree of partial sums) that is
+    built once per word. A count update only changes the leaves of the old and new topic, which are updated in place
+    in O(log K), and a topic is drawn from the tree in O(log K). The N_kj * q_k part is summed over the nonzero topics
+    of the document. The draws are exact, with the uniforms consumed in word-major token order. Takes the arguments of
+    standard_sweep, plus the nonzero topics of every document which persist across sweeps, see _nonzero_topics. They are
+    kept sorted, so that the draws only depend on the counts and not on the history of the lists.
+
+    :param doc_topics: Nonzero topics of every document, updated in place as topics are added to / removed from it
+    :param doc_topic_offsets: Offsets of the topics of each document into doc_topics
+    :param doc_nnz: Number of nonzero topics of every document, updated in place
+    """
+    K = n_k.shape[0]
+    W_beta = n_wk.shape[0] * beta
+    n_leaves = 1
+    while n_leaves < K:
+        n_leaves *= 2
+    tree = np.zeros(2 * n_leaves)
+
+    # Swept tokens in word-major order, with their documents
+    n_swept = 0
+    for d in docs:
+        n_swept += doc_offsets[d + 1] - doc_offsets[d]
+    positions = np.empty(n_swept, dtype=np.int64)
+    token_docs = np.empty(n_swept, dtype=np.int64)
+    t = 0
+    for d in docs:
+        for i in range(doc_offsets[d], doc_offsets[d + 1]):
+            positions[t] = i
+            token_docs[t] = d
+            t += 1
+    word_order = np.argsort(token_ids[positions], kind="mergesort")
+
+    doc_terms = np.empty(K)
+    prev_word = -1
+    for u_idx in range(n_swept):
+        t = word_order[u_idx]
+        i, d = positions[t], token_docs[t]
+        word = token_ids[i]
+        curr_topic = topics[i]
+        start = doc_topic_offsets[d]
+
+        if word != prev_word:
+            for k in range(K):
+                tree[n_leaves + k] = (n_wk[word, k] + beta) / (n_k[k] + W_beta)
+            for node in range(n_leaves - 1, 0, -1):
+                tree[node] = tree[2 * node] + tree[2 * node + 1]
+            prev_word = word
+
+        n_dk[d, curr_topic] -= 1
+        n_wk[word, curr_topic] -= 1
+        n_k[curr_topic] -= 1
+        _update_leaf(
+            tree,
+            n_leaves + curr_topic,
+            (n_wk[word, curr_topic] + beta) / (n_k[curr_topic] + W_beta),
+        )
+        if n_dk[d, curr_topic] == 0:
+            doc_nnz[d] = _remove_sorted(doc_topics[start:], doc_nnz[d], curr_topic)
+
+        doc_mass = 0.0
+        for t in range(doc_nnz[d]):
+            k = doc_topics[start + t]
+            doc_mass += n_dk[d, k] * tree[n_leaves + k]
+            doc_terms[t] = doc_mass
+
+        x = uniforms[u_idx] * (doc_mass + alpha * tree[1])
+        if x < doc_mass:
+            new_topic = doc_topics[start + doc_nnz[d] - 1]
+            for t in range(doc_nnz[d]):
+                if x < doc_terms[t]:
+                    new_topic = doc_topics[start + t]
+                    break
+        else:
+            new_topic = min(_descend(tree, (x - doc_mass) / alpha) - n_leaves, K - 1)
+
+        if n_dk[d, new_topic] == 0:
+            doc_nnz[d] = _insert_sorted(doc_topics[start:], doc_nnz[d], new_topic)
+        topics[i] = new_topic
+        n_dk[d, new_topic] += 1
+        n_wk[word, new_topic] += 1
+        n_k[new_topic] += 1
+        _update_leaf(
+            tree, n_leaves + new_topic, (n_wk[word, new_topic] + beta) / (n_k[new_topic] + W_beta)
+        )
+
+
+@register_jitable
+def _update_leaf(tree, leaf, value):
+    """Set a leaf of an F+tree and recompute the partial sums on its path to the root"""
+    tree[leaf] = value
+    node = leaf // 2
+    while node >= 1:
+        tree[node] = tree[2 * node] + tree[2 * node + 1]
+        node //= 2
+
+
+@register_jitable
+def _descend(tree, x):
+    """Find the leaf of an F+tree at which the running sum of leaves first exceeds x"""
+    n_leaves = tree.shape[0] // 2
+    node = 1
+    while node < n_leaves:
+        left = 2 * node
+        if x < tree[left]:
+            node = left
+        else:
+            x -= tree[left]
+            node = left + 1
+    return node
+
+
+@register_jitable
+def _cube(x):
+    """x ** 3 without going through the generic power function"""
+    return x * x * x
+
+
+@register_jitable
+def _inverse_cdf(cumulative, u):
+    """Index of the first entry of an unnormalized cumulative distribution exceeding u times its total"""
+    k = np.searchsorted(cumulative, u * cumulative[-1], side="right")
+    # Guard against u * total rounding up to the total itself
+    return min(k, cumulative.shape[0] - 1)
+
+
+class StandardSampler:
+    """Plain O(K) collapsed Gibbs sampler evaluating Eq. 1 one topic at a time"""
+
+    kernel = staticmethod(standard_sweep)
+    uniforms_per_token = 1
+
+    def __init__(self, alpha, beta, backend="python"):
+        self.alpha = alpha
+        self.beta = beta
+        self._kernel = compile_kernel(self.kernel, backend)
+
+    def sweep(self, token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, uniforms):
+        """Run one sweep over docs, see standard_sweep for the arguments"""
+        self._kernel(
+            token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, self.alpha, self.beta, uniforms
+        )
+
+    def reset(self):
+        """Drop any state kept across sweeps, e.g. when the counts were changed outside of the sweeps"""
+
+
+class VectorizedSampler(StandardSampler):
+    """O(K) collapsed Gibbs sampler evaluating Eq. 1 with NumPy array operations"""
+
+    kernel = staticmethod(vectorized_sweep)
+
+
+class FastLDASampler(StandardSampler):
+    """Exact collapsed Gibbs sampler of Porteous et al. with sublinear expected cost per token in K"""
+
+    kernel = staticmethod(fastlda_sweep)
+
+
+class SparseSampler(StandardSampler):
+    """Exact collapsed Gibbs sampler of Yao et al. exploiting sparsity of the document and word topic counts"""
+
+    kernel = staticmethod(sparse_sweep)
+
+    def __init__(self, alpha, beta, backend="python"):
+        super().__init__(alpha, beta, backend=backend)
+        self.reset()
+
+    def reset(self):
+        """Rebuild the nonzero topics of the swept words on the next sweep"""
+        self._n_wk = None
+
+    def sweep(self, token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, uniforms):
+        """Run one sweep over docs, see sparse_sweep for the arguments"""
+        words = _swept_words(token_ids, doc_offsets, docs, n_wk.shape[0])
+        if (
+            self._n_wk is not n_wk
+            or self._word_nnz.shape[0] != n_wk.shape[0]
+            or not self._listed[words].all()
+        ):
+            # The lists persist across sweeps of the same counts, which only the sweeps change
+            self._word_topics, self._word_topic_offsets, self._word_nnz = _nonzero_topics(
+                n_wk, words
+            )
+            self._listed = np.zeros(n_wk.shape[0], dtype=bool)
+            self._listed[words] = True
+            self._n_wk = n_wk
+
+        self._kernel(
+            token_ids,
+            doc_offsets,
+            docs,
+            topics,
+            n_dk,
+            n_wk,
+            n_k,
+            self.alpha,
+            self.beta,
+            uniforms,
+            self._word_topics,
+            self._word_topic_offsets,
+            self._word_nnz,
+        )
+
+
+class FTreeSampler(StandardSampler):
+    """Exact collapsed Gibbs sampler drawing from an F+tree in O(log K) per token, plus the document's nonzero topics"""
+
+    kernel = staticmethod(ftree_sweep)
+
+    def __init__(self, alpha, beta, backend="python"):
+        super().__init__(alpha, beta, backend=backend)
+        self.reset()
+
+    def reset(self):
+        """Rebuild the nonzero topics of the swept documents on the next sweep"""
+        self._n_dk = None
+
+    def sweep(self, token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, uniforms):
+        """Run one sweep over docs, see ftree_sweep for the arguments"""
+        if (
+            self._n_dk is not n_dk
+            or self._doc_nnz.shape[0] != n_dk.shape[0]
+            or not self._listed[docs].all()
+        ):
+            # The lists persist across sweeps of the same counts, which only the sweeps change
+            rows = np.unique(docs)
+            self._doc_topics, self._doc_topic_offsets, self._doc_nnz = _nonzero_topics(n_dk, rows)
+            self._listed = np.zeros(n_dk.shape[0], dtype=bool)
+            self._listed[rows] = True
+            self._n_dk = n_dk
+
+        self._kernel(
+            token_ids,
+            doc_offsets,
+            docs,
+            topics,
+            n_dk,
+            n_wk,
+            n_k,
+            self.alpha,
+            self.beta,
+            uniforms,
+            self._doc_topics,
+            self._doc_topic_offsets,
+            self._doc_nnz,
+        )
+
+
+class AliasSampler(StandardSampler):
+    """Metropolis-Hastings sampler with alias-table proposals whose amortized cost per token is O(1) in K
+
+    Unlike the other samplers the draws are not exact: every token runs a short MH chain which leaves Eq. 1 invariant.
+    """
+
+    kernel = staticmethod(alias_sweep)
+
+    def __init__(self, alpha, beta, backend="python", mh_steps=2, rebuild_every=None):
+        """
+        :param mh_steps: Number of MH steps per token, alternating between the word and the doc proposal
+        :param rebuild_every: Number of draws from a word's alias table before it is rebuilt. Defaults to K
+        """
+        super().__init__(alpha, beta, backend=backend)
+        self.mh_steps = mh_steps
+        self.rebuild_every = rebuild_every
+        self.uniforms_per_token = 2 * mh_steps
+        self._alias_prob = None
+
+    def sweep(self, token_ids, doc_offsets, docs, topics, n_dk, n_wk, n_k, uniforms):
+        """Run one sweep over docs, see alias_sweep for the arguments"""
+        if self._alias_prob is None or self._alias_prob.shape != n_wk.shape:
+            # Tables persist across sweeps and are built lazily per word
+            self._alias_prob = np.zeros(n_wk.shape, dtype=np.float32)
+            self._alias_idx = np.zeros(n_wk.shape, dtype=np.int32)
+            self._proposal = np.zeros(n_wk.shape, dtype=np.float32)
+            self._uses = np.full(n_wk.shape[0], -1, dtype=np.int64)
+
+        self._kernel(
+            token_ids,
+            doc_offsets,
+            docs,
+            topics,
+            n_dk,
+            n_wk,
+            n_k,
+            self.alpha,
+            self.beta,
+            uniforms,
+            self.mh_steps,
+            self.rebuild_every or n_k.shape[0],
+            self._alias_prob,
+            self._alias_idx,
+            self._proposal,
+            self._uses,
+        )
+
+
+SAMPLERS = {
+    "standard": StandardSampler,
+    "vectorized": VectorizedSampler,
+    "fastlda": FastLDASampler,
+    "sparse": SparseSampler,
+    "ftree": FTreeSampler,
+    "alias": AliasSampler,
+}
+
+
+def get_sampler(name, alpha, beta, backend="python", **options):
+    """Instantiate one of the registered samplers by name, running on the given backend
+
+    :param options: Sampler specific settings, e.g. mh_steps for the alias sampler
+    """
+    if name not in SAMPLERS:
+        raise ValueError(f"Unknown sampler '{name}', expected one of {sorted(SAMPLERS)}")
+    return SAMPLERS[name](alpha, beta, backend=backend, **options)
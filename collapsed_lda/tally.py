@@ -0,0 +1,108 @@
+"""Running tally of the topics every token takes along a Markov chain, from which the mode of each chain is read.
+
+Each (token, topic) pair that occurred is scored as
+
+    count * (n_samples + 1) + (n_samples - first sample holding the topic)
+
+so the most frequent topic has the highest score, with ties going to the topic which occurred first. After burn-in a
+token only visits a few topics, so the pairs are stored sparsely: every token has a few slots of (topic, score), and
+pairs that do not fit into the slots of their token go to a sorted overflow list. Memory thus grows with the number of
+distinct topics visited rather than with K.
+"""
+from typing import Dict
+
+import numpy as np
+
+
+class TopicTally:
+    def __init__(self, n_tokens: int, K: int, n_samples: int, n_slots: int = 4):
+        """
+        :param n_tokens: Number of tokens tallied
+        :param K: Number of topics
+        :param n_samples: Number of states of each chain that will be tallied
+        :param n_slots: Number of topics per token stored in the slots before overflowing
+        """
+        self.K = K
+        self.n_samples = n_samples
+        score_dtype = np.min_scalar_type(n_samples * (n_samples + 2))
+        # K marks an empty slot
+        self.slot_topics = np.full((n_tokens, n_slots), K, dtype=np.min_scalar_type(K))
+        self.slot_scores = np.zeros((n_tokens, n_slots), dtype=score_dtype)
+        # Sorted token * K + topic keys of the pairs that did not fit into the slots, and their scores
+        self.overflow_keys = np.zeros(0, dtype=np.int64)
+        self.overflow_scores = np.zeros(0, dtype=score_dtype)
+
+    @property
+    def n_tokens(self) -> int:
+        return self.slot_topics.shape[0]
+
+    def update(self, topics: np.ndarray, sample: int):
+        """Add a state of the chains to the tally
+
+        :param topics: Topic of every token in the state
+        :param sample: Index of the state among the tallied states of the chain
+        """
+        n_samples = self.n_samples
+        rows = np.arange(self.n_tokens)
+        first_score = (n_samples + 1) + (n_samples - sample)
+
+        # Topics already in a slot
+        match = self.slot_topics == topics[:, None]
+        in_slot = match.any(axis=1)
+        self.slot_scores[rows[in_slot], match[in_slot].argmax(axis=1)] += n_samples + 1
+
+        # Topics new to the token, put in its first free slot if any
+        free = self.slot_topics == self.K
+        new_in_slot = ~in_slot & free.any(axis=1)
+        new_rows = rows[new_in_slot]
+        new_slots = free[new_in_slot].argmax(axis=1)
+        self.slot_topics[new_rows, new_slots] = topics[new_in_slot]
+        self.slot_scores[new_rows, new_slots] = first_score
+
+        # Everything else overflows
+        is_overflow = ~in_slot & ~new_in_slot
+        if is_overflow.any():
+            keys = rows[is_overflow].astype(np.int64) * self.K + topics[is_overflow]
+            pos = np.searchsorted(self.overflow_keys, keys)
+            found = np.zeros(keys.shape, dtype=bool)
+            in_range = pos < self.overflow_keys.shape[0]
+            found[in_range] = self.overflow_keys[pos[in_range]] == keys[in_range]
+            self.overflow_scores[pos[found]] += n_samples + 1
+            self.overflow_keys = np.insert(self.overflow_keys, pos[~found], keys[~found])
+            self.overflow_scores = np.insert(self.overflow_scores, pos[~found], first_score)
+
+    def modes(self) -> np.ndarray:
+        """Mode of the chain of every token, ties going to the topic which occurred first"""
+        rows = np.arange(self.n_tokens)
+        best_slot = self.slot_scores.argmax(axis=1)
+        modes = self.slot_topics[rows, best_slot].astype(np.int32)
+        best_scores = self.slot_scores[rows, best_slot]
+
+        if self.overflow_keys.shape[0]:
+            tokens, topics = np.divmod(self.overflow_keys, self.K)
+            # Highest overflow score of every token: the last entry per token once sorted by token, then score
+            order = np.lexsort((self.overflow_scores, tokens))
+            is_last = np.append(tokens[order][1:] != tokens[order][:-1], True)
+            best = order[is_last]
+            better = self.overflow_scores[best] > best_scores[tokens[best]]
+            modes[tokens[best][better]] = topics[best][better]
+        return modes
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays holding the tally, e.g. for a checkpoint"""
+        return {
+            f"{prefix}slot_topics": self.slot_topics,
+            f"{prefix}slot_scores": self.slot_scores,
+            f"{prefix}overflow_keys": self.overflow_keys,
+            f"{prefix}overflow_scores": self.overflow_scores,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str, K: int, n_samples: int):
+        """Restore a tally from the arrays of to_arrays"""
+        tally = cls(0, K, n_samples)
+        tally.slot_topics = arrays[f"{prefix}slot_topics"]
+        tally.slot_scores = arrays[f"{prefix}slot_scores"]
+        tally.overflow_keys = arrays[f"{prefix}overflow_keys"]
+        tally.overflow_scores = arrays[f"{prefix}overflow_scores"]
+        return tally
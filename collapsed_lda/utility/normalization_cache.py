@@ -0,0 +1,119 @@
+"""Memo of normalized word forms (e.g. stems) keyed by surface form.
+
+A corpus has far fewer distinct surface forms than token occurrences, so normalizing every distinct form once and
+looking up the rest saves most of the stemming / lemmatization work. A cache pickles along with whatever holds it, so
+pool workers start from a warm copy, and the entries a worker adds can be collected and merged back into the cache of
+the parent process. Caches are saved as JSON to be reused between runs.
+"""
+import json
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Mapping, Optional
+
+FORMAT_VERSION = 1
+
+
+class NormalizationCache:
+    def __init__(self, maxsize: Optional[int] = None):
+        """
+        :param maxsize: Maximum number of entries. Once full, the least recently used entries are evicted first. None
+            is unbounded
+        """
+        if maxsize is not None and maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        # Ordered from least to most recently used
+        self._entries: Dict[Hashable, str] = OrderedDict()
+        # Entries added since track_added was called, collected with pop_added
+        self._added: Optional[Dict[Hashable, str]] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        if key not in self._entries:
+            return default
+        if self.maxsize is not None:
+            self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def add(self, key: Hashable, value: str) -> str:
+        """Store the normalized form of key, evicting the least recently used entry if the cache is full
+
+        :return: value, so misses can be filled inline
+        """
+        entries = self._entries
+        if self.maxsize is not None:
+            if key in entries:
+                entries.move_to_end(key)
+            elif len(entries) >= self.maxsize:
+                entries.popitem(last=False)
+        entries[key] = value
+        if self._added is not None:
+            self._added[key] = value
+        return value
+
+    def normalize_all(self, words: Iterable[str], normalize: Callable[[str], str]) -> List[str]:
+        """Normalize words, calling normalize only on words not in the cache
+
+        :param words: Surface forms, which are also the keys
+        :param normalize: Function mapping a surface form to its normalized form, e.g. PorterStemmer().stem
+        :return: The normalized forms, in order
+        """
+        entries = self._entries
+        if self.maxsize is not None:
+            # Hits refresh their entries
+            get = self.get
+            return [
+                value if (value := get(word)) is not None else self.add(word, normalize(word))
+                for word in words
+            ]
+        return [
+            entries[word] if word in entries else self.add(word, normalize(word)) for word in words
+        ]
+
+    def update(self, entries: Mapping[Hashable, str]):
+        """Merge entries, e.g. those added by a worker process"""
+        for key, value in entries.items():
+            self.add(key, value)
+
+    def track_added(self):
+        """Start recording added entries, to be collected with pop_added"""
+        self._added = {}
+
+    def pop_added(self) -> Dict[Hashable, str]:
+        """Entries added since the previous call (or track_added)"""
+        added, self._added = self._added, {}
+        return added
+
+    def save(self, path):
+        """Write the entries to a JSON file
+
+        :param path: Destination of the cache. Replaced if it exists
+        """
+        with open(path, "w") as f:
+            json.dump(
+                {"format_version": FORMAT_VERSION, "entries": list(self._entries.items())}, f
+            )
+
+    @classmethod
+    def load(cls, path, maxsize: Optional[int] = None) -> "NormalizationCache":
+        """Read a cache written by save
+
+        :param path: Path of the cache
+        :param maxsize: See __init__
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if data["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported cache format version {data['format_version']}, "
+                f"expected {FORMAT_VERSION}"
+            )
+
+        cache = cls(maxsize)
+        # JSON turns tuple keys into lists
+        cache.update({tuple(k) if isinstance(k, list) else k: v for k, v in data["entries"]})
+        return cache
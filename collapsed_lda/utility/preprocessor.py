@@ -0,0 +1,110 @@
+import multiprocessing
+from typing import Dict, Hashable, Iterable, List, Optional, Union
+
+from nltk.stem import PorterStemmer
+
+from collapsed_lda.utility.normalization_cache import NormalizationCache
+from collapsed_lda.utility.utility import _TRANSLATION, _english_stop_words
+
+# Per-process preprocessor of pool workers, set up once by _init_worker
+_worker = {}
+
+
+class Preprocessor:
+    """Text preprocessing pipeline for raw documents: tokenize (see tokenize_doc), remove stop words and numbers (see
+    remove_stop_words) and stem (see stem_tokens). The stop word set, translation table and stemmer are built once and
+    reused for every document, and each distinct token is stemmed once through a NormalizationCache
+    """
+
+    def __init__(
+        self,
+        stop_words: Optional[Iterable[str]] = None,
+        extra_words: Optional[Iterable[str]] = None,
+        remove_numbers=True,
+        tokens_have_quotes=False,
+        stem=True,
+        stem_cache: Optional[NormalizationCache] = None,
+    ):
+        """
+        :param stop_words: Words removed from the tokens. Defaults to the English stop words of NLTK
+        :param extra_words: Additional words that will be removed from tokens
+        :param remove_numbers: Should number strings be removed from the tokens?
+        :param tokens_have_quotes: Do the tokens contain quotes? If so, quotes are removed from tokens and stop words
+        :param stem: Should tokens be stemmed with the Porter stemmer?
+        :param stem_cache: Cache of stems by token, e.g. loaded from a previous run. Defaults to an empty cache
+        """
+        if stop_words is None:
+            stop_words = _english_stop_words()
+        stop_words = [*stop_words, *(extra_words or [])]
+        if tokens_have_quotes:
+            stop_words = [word.replace("'", "") for word in stop_words]
+
+        self.stop_words = frozenset(stop_words)
+        self.remove_numbers = remove_numbers
+        self.tokens_have_quotes = tokens_have_quotes
+        self.stemmer = PorterStemmer() if stem else None
+        self.stem_cache = NormalizationCache() if stem_cache is None else stem_cache
+        self._translation = _TRANSLATION
+
+    def tokenize(self, doc: str) -> List[str]:
+        """Convert document to lowercase, remove punctuation, and split on whitespace"""
+        return doc.lower().translate(self._translation).split()
+
+    def process(self, doc: str) -> List[str]:
+        """Run the whole pipeline on a single document
+
+        :param doc: Raw text of the document
+        :return: Tokens of the document
+        """
+        tokens = self.tokenize(doc)
+        if self.tokens_have_quotes:
+            tokens = [token.replace("'", "") for token in tokens]
+
+        stop_words = self.stop_words
+        tokens = [token for token in tokens if token not in stop_words]
+        if self.remove_numbers:
+            tokens = [token for token in tokens if not token.isnumeric()]
+        if self.stemmer is not None:
+            tokens = self.stem_cache.normalize_all(tokens, self.stemmer.stem)
+        return tokens
+
+    def process_many(
+        self,
+        docs: Union[Dict[Hashable, str], Iterable[str]],
+        n_jobs: int = 1,
+        chunksize: int = 256,
+    ) -> Union[Dict[Hashable, List[str]], List[List[str]]]:
+        """Run the pipeline on many documents, optionally across a pool of worker processes
+
+        :param docs: Dictionary mapping document identifiers (titles) to their raw text, or an iterable of raw texts
+        :param n_jobs: Number of worker processes, each handed the preprocessor once. -1 uses all CPUs. Stems added
+            by the workers are merged into stem_cache
+        :param chunksize: Number of documents sent to a worker at a time
+        :return: Tokens of every document, keyed like docs if it is a dictionary and in order otherwise
+        """
+        texts = docs.values() if isinstance(docs, dict) else docs
+        if n_jobs == 1:
+            tokens = [self.process(doc) for doc in texts]
+        else:
+            with multiprocessing.Pool(
+                None if n_jobs == -1 else n_jobs, initializer=_init_worker, initargs=(self,)
+            ) as pool:
+                results = pool.map(_process, texts, chunksize=chunksize)
+            tokens = [doc_tokens for doc_tokens, _ in results]
+            for _, added in results:
+                self.stem_cache.update(added)
+
+        if isinstance(docs, dict):
+            return dict(zip(docs.keys(), tokens))
+        return tokens
+
+
+def _init_worker(preprocessor):
+    preprocessor.stem_cache.track_added()
+    _worker["preprocessor"] = preprocessor
+
+
+def _process(doc):
+    """Tokens of the document along with the stems the worker had not seen before"""
+    preprocessor = _worker["preprocessor"]
+    return preprocessor.process(doc), preprocessor.stem_cache.pop_added()
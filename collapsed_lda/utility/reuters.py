@@ -0,0 +1,98 @@
+"""Streaming reader of the Reuters-21578 collection.
+
+The SGM files hold one <REUTERS> element per article, each starting on a new line. Files are read line by line and
+every article is parsed on its own with regular expressions as soon as its closing tag is reached, so only one article
+is held in memory at a time. Articles are identified by their NEWID, which is unique across the collection, unlike
+their titles.
+"""
+import glob
+import html
+import multiprocessing
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+DEFAULT_PATTERN = "data/reuters21578/reut2-*.sgm"
+
+_NEWID = re.compile(r'NEWID="(\d+)"')
+_TEXT = re.compile(r"<TEXT[^>]*>(.*?)</TEXT>", re.DOTALL)
+_TITLE = re.compile(r"<TITLE>(.*?)</TITLE>", re.DOTALL)
+_BODY = re.compile(r"<BODY>(.*?)</BODY>", re.DOTALL)
+_TAG = re.compile(r"<[^>]*>")
+
+Article = Tuple[int, Optional[str], str]
+
+
+def parse_article(sgm: str) -> Article:
+    """Parse a single <REUTERS> element
+
+    :param sgm: SGM of the element, from its opening to its closing tag
+    :return: (NEWID, title, body) of the article. The title is None for the few articles without one. For articles
+        without a <BODY> (types BRIEF and UNPROC), the body is the rest of their text without markup
+    """
+    newid = int(_NEWID.search(sgm).group(1))
+    text_match = _TEXT.search(sgm)
+    text = text_match.group(1) if text_match else ""
+
+    title = _TITLE.search(text)
+    if title:
+        title = html.unescape(title.group(1)).strip()
+
+    body = _BODY.search(text)
+    if body:
+        body = body.group(1)
+    else:
+        # Text of BRIEF and UNPROC articles without its title
+        body = _TAG.sub("", _TITLE.sub("", text))
+    return newid, title, html.unescape(body)
+
+
+def iter_sgm_articles(lines: Iterable[str]) -> Iterator[Article]:
+    """Lazily parse the articles of SGM data
+
+    :param lines: Lines of SGM data, e.g. an open SGM file
+    :return: Generator of (NEWID, title, body) per article, in order
+    """
+    article_lines = None
+    for line in lines:
+        if line.startswith("<REUTERS"):
+            article_lines = []
+        if article_lines is not None:
+            article_lines.append(line)
+            if line.startswith("</REUTERS>"):
+                yield parse_article("".join(article_lines))
+                article_lines = None
+
+
+def iter_sgm_file(path) -> Iterator[Article]:
+    """Lazily parse the articles of an SGM file
+
+    :param path: Path of the SGM file
+    :return: Generator of (NEWID, title, body) per article, in file order
+    """
+    # A few articles contain bytes outside of ASCII
+    with open(path, encoding="latin-1") as f:
+        yield from iter_sgm_articles(f)
+
+
+def iter_reuters(
+    paths: Union[str, Iterable[str]] = DEFAULT_PATTERN, n_jobs: int = 1
+) -> Iterator[Article]:
+    """Lazily parse the articles of many SGM files, optionally across a pool of worker processes
+
+    :param paths: Glob pattern of the SGM files, or their paths. Defaults to the whole collection
+    :param n_jobs: Number of worker processes, each parsing whole files. -1 uses all CPUs
+    :return: Generator of (NEWID, title, body) per article, in order of the paths (sorted if
+        given as a pattern)
+    """
+    paths = sorted(glob.glob(paths)) if isinstance(paths, str) else list(paths)
+    if n_jobs == 1:
+        for path in paths:
+            yield from iter_sgm_file(path)
+    else:
+        with multiprocessing.Pool(None if n_jobs == -1 else n_jobs) as pool:
+            for articles in pool.imap(_parse_file, paths):
+                yield from articles
+
+
+def _parse_file(path) -> List[Article]:
+    return list(iter_sgm_file(path))
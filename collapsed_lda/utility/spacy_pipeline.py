@@ -0,0 +1,113 @@
+"""Batched spaCy preprocessing of many documents.
+
+Documents go through nlp.pipe in batches with only the components lemmatization needs, and preprocess_spacy_doc is
+applied right away, so only lemma lists (rather than Doc objects) are kept or sent back by worker processes. The lemmas
+can be cached on disk, keyed by a hash of the texts, the pipeline config and the stop words, so repeated runs over the
+same corpus skip spaCy entirely.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+from typing import Iterable, List, Optional, Sequence
+
+import spacy
+from spacy.language import Language
+
+from collapsed_lda.utility.utility import preprocess_spacy_doc
+
+# Components the lemmatizer of the English pipelines depends on
+DEFAULT_COMPONENTS = ("tok2vec", "tagger", "attribute_ruler", "lemmatizer")
+FORMAT_VERSION = 1
+
+# Per-process pipeline of pool workers, set up once by _init_worker
+_worker = {}
+
+
+def preprocess_spacy_docs(
+    texts: Sequence[str],
+    nlp: Language,
+    stop_words: Optional[Iterable[str]] = None,
+    components: Sequence[str] = DEFAULT_COMPONENTS,
+    batch_size: int = 1000,
+    n_jobs: int = 1,
+    cache_dir=None,
+) -> List[List[str]]:
+    """Run preprocess_spacy_doc over the spaCy processing of many documents
+
+    :param texts: Raw texts of the documents
+    :param nlp: spaCy pipeline, e.g. spacy.load("en_core_web_sm")
+    :param stop_words: Lemmas removed from the documents, see preprocess_spacy_doc
+    :param components: Components of nlp to run, others are disabled. Names not in the pipeline are ignored
+    :param batch_size: Number of documents processed by nlp.pipe at a time, and sent to a worker at a time
+    :param n_jobs: Number of worker processes, each handed the pipeline once. -1 uses all CPUs
+    :param cache_dir: Directory of the on-disk cache. If None, nothing is cached
+    :return: Lemmas of every document, in order
+    """
+    stop_words = frozenset(stop_words or [])
+    enable = [name for name in nlp.pipe_names if name in components]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f"{_cache_key(texts, nlp, enable, stop_words)}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                return json.load(f)["lemmas"]
+
+    if n_jobs == 1:
+        with nlp.select_pipes(enable=enable):
+            lemmas = [
+                preprocess_spacy_doc(doc, stop_words)
+                for doc in nlp.pipe(texts, batch_size=batch_size)
+            ]
+    else:
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        with multiprocessing.Pool(
+            None if n_jobs == -1 else n_jobs,
+            initializer=_init_worker,
+            initargs=(nlp, enable, stop_words, batch_size),
+        ) as pool:
+            lemmas = [doc for batch in pool.imap(_process_batch, batches) for doc in batch]
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written next to its destination and renamed over it, so an interrupted run leaves no partial cache
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format_version": FORMAT_VERSION, "lemmas": lemmas}, f)
+        os.replace(tmp_path, cache_path)
+    return lemmas
+
+
+def _cache_key(texts, nlp, enable, stop_words) -> str:
+    """Hash of everything the lemmas depend on"""
+    digest = hashlib.sha256()
+    config = {
+        "format_version": FORMAT_VERSION,
+        "spacy_version": spacy.__version__,
+        "model": f"{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+        "config": nlp.config.to_str(),
+        "enable": enable,
+        "stop_words": sorted(stop_words),
+    }
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    for text in texts:
+        # Length prefix keeps document boundaries part of the hash
+        encoded = text.encode()
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def _init_worker(nlp, enable, stop_words, batch_size):
+    """Hand a pool worker the pipeline, with only the needed components enabled"""
+    nlp.select_pipes(enable=enable)
+    _worker.update(nlp=nlp, stop_words=stop_words, batch_size=batch_size)
+
+
+def _process_batch(texts):
+    nlp = _worker["nlp"]
+    return [
+        preprocess_spacy_doc(doc, _worker["stop_words"])
+        for doc in nlp.pipe(texts, batch_size=_worker["batch_size"])
+    ]
@@ -1,35 +1,41 @@
+import io
 import string
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
 from typing import List
 
-from bs4 import BeautifulSoup
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 from spacy.tokens import Doc
-from tqdm import tqdm
+
+from collapsed_lda.utility.normalization_cache import NormalizationCache
+from collapsed_lda.utility.reuters import iter_sgm_articles
 
 
 def parse_sgm_file(sgm_data):
     """
-    Returns a dictionary with titles + articles of an SGM file
+    Returns a dictionary with titles + articles of an SGM file. Articles sharing a title overwrite each other, see
+    collapsed_lda.utility.reuters.iter_reuters to stream articles keyed by their NEWID instead
 
     :param sgm_data: Data read from an SGM file
     :return: A dictionary mapping titles to article contents
     """
 
-    soup = BeautifulSoup(sgm_data, features="html5lib")
-    texts = soup.find_all("text")
     title_docs = {}
-    for text in texts:
-        title = text.findChild("title")
-
+    for _, title, body in iter_sgm_articles(io.StringIO(sgm_data)):
         # Title is non-existent for a few articles
         if title:
-            # Use contents because the text has no name; always the last element
-            title_docs[title.string.strip()] = text.contents[-1]
+            title_docs[title] = body
 
     return title_docs
 
 
+# Maps whitespace (and the end of file char) to spaces and deletes punctuation
+_WHITESPACE = string.whitespace + "\x03"
+_TRANSLATION = str.maketrans(_WHITESPACE, " " * len(_WHITESPACE), string.punctuation)
+
+
 def tokenize_doc(doc: str):
     """
     Convert document to lowercase, remove punctuation, and split on whitespace
@@ -39,9 +45,7 @@ def tokenize_doc(doc: str):
     """
 
     doc = doc.lower()
-    whitespace = string.whitespace + "\x03"  # End of file char
-    trans = str.maketrans(whitespace, " " * len(whitespace), string.punctuation)
-    doc_no_punc = doc.translate(trans)
+    doc_no_punc = doc.translate(_TRANSLATION)
     return doc_no_punc.split()
 
 
@@ -58,8 +62,7 @@ def remove_stop_words(tokens, remove_numbers=True, tokens_have_quotes=False, ext
     if extra_words is None:
         extra_words = []
 
-    stop_words = stopwords.words("English")
-    stop_words += extra_words
+    stop_words = _english_stop_words().union(extra_words)
 
     if tokens_have_quotes:
         stop_words = set([word.replace("'", "") for word in stop_words])
@@ -71,16 +74,29 @@ def remove_stop_words(tokens, remove_numbers=True, tokens_have_quotes=False, ext
     return tokens_no_stop
 
 
-def stem_tokens(tokens):
+@lru_cache(maxsize=None)
+def _english_stop_words():
+    """English stop words of NLTK, loaded once"""
+    return frozenset(stopwords.words("English"))
+
+
+_STEMMER = PorterStemmer()
+# Default cache of stem_tokens, shared by all its calls in a process
+_STEM_CACHE = NormalizationCache()
+
+
+def stem_tokens(tokens, cache: NormalizationCache = None):
     """
     Stem tokens using the Porter stemmer
 
     :param tokens: List of tokens
+    :param cache: Cache of stems by token, so each distinct token is stemmed once. Defaults to a per-process cache
     :return: A stemmed list of the same tokens
     """
 
-    ps = PorterStemmer()
-    tokens_stemmed = [ps.stem(token) for token in tokens]
+    if cache is None:
+        cache = _STEM_CACHE
+    tokens_stemmed = cache.normalize_all(tokens, _STEMMER.stem)
     return tokens_stemmed
 
 
@@ -99,11 +115,11 @@ def preprocess_spacy_doc(doc: Doc, stop_words=None):
 
 def filter_extremes(docs: List[List[str]], vocabulary, more_than: int = 10):
     """Filter out rare tokens. Per Porteous the vocabulary was filtered 'by only keeping words that occurred
-    more than ten times'"""
-    # Take words that appear more than "more than" times
-    good_words = [
-        word for word in tqdm(vocabulary) if more_than < sum([doc.count(word) for doc in docs])
-    ]
+    more than ten times'. See collapsed_lda.vocabulary.Vocabulary to also prune by document frequency and encode the
+    corpus in the same pass"""
+    # Count every word in a single pass, then take words that appear more than "more than" times
+    counts = Counter(chain.from_iterable(docs))
+    good_words = {word for word in vocabulary if counts[word] > more_than}
 
     tokens = [[word for word in doc if word in good_words] for doc in docs]
     return tokens
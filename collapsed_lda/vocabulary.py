@@ -0,0 +1,127 @@
+from typing import Dict, Hashable, Iterable, List, Optional, Union
+
+import numpy as np
+
+from collapsed_lda.corpus import Corpus
+
+
+class Vocabulary:
+    """Builds a pruned vocabulary and the integer-encoded corpus over it in a single pass over the tokens.
+
+    While streaming over the documents every word gets a provisional id, so the corpus is encoded as it is counted.
+    Term and document frequencies are then computed from the provisional ids with array operations, the vocabulary is
+    pruned, and the provisional ids are mapped to the final ones, dropping the tokens of pruned words.
+    """
+
+    def __init__(
+        self,
+        min_count: int = 1,
+        min_df: Union[int, float] = 1,
+        max_df: Union[int, float] = 1.0,
+        keep_top_n: Optional[int] = None,
+    ):
+        """
+        :param min_count: Minimum number of occurrences of a word across the corpus. Porteous et al. only keep words
+            that occurred more than ten times, i.e. min_count=11
+        :param min_df: Minimum number of documents a word occurs in. A float is a fraction of the documents
+        :param max_df: Maximum number of documents a word occurs in. A float is a fraction of the documents
+        :param keep_top_n: Only keep this many of the remaining words, those occurring most often
+        """
+        self.min_count = min_count
+        self.min_df = min_df
+        self.max_df = max_df
+        self.keep_top_n = keep_top_n
+
+        self.vocabulary: List[str] = []
+        self.word_to_id: Dict[str, int] = {}
+        self.term_frequency = np.zeros(0, dtype=np.int64)
+        self.document_frequency = np.zeros(0, dtype=np.int64)
+
+    def fit_transform(
+        self, doc_to_tokens: Union[Dict[Hashable, List[str]], Iterable[tuple]]
+    ) -> Corpus:
+        """Count the words of the documents, prune the vocabulary and encode the documents against it
+
+        :param doc_to_tokens: Dictionary mapping document identifiers (titles) to their tokens, or an iterable of
+            (identifier, tokens) pairs, which is only consumed once
+        :return: The encoded corpus. Documents keep their place even if all of their words are pruned
+        """
+        items = doc_to_tokens.items() if isinstance(doc_to_tokens, dict) else doc_to_tokens
+
+        # Single pass: encode against provisional ids, assigned in order of first occurrence
+        provisional_ids = {}
+        doc_ids = []
+        doc_lengths = []
+        token_chunks = []
+        for doc, tokens in items:
+            doc_ids.append(doc)
+            doc_lengths.append(len(tokens))
+            token_chunks.append(
+                [provisional_ids.setdefault(word, len(provisional_ids)) for word in tokens]
+            )
+        words = list(provisional_ids)
+        n_words, n_docs = len(words), len(doc_ids)
+
+        token_ids = np.fromiter(
+            (i for chunk in token_chunks for i in chunk), dtype=np.int64, count=sum(doc_lengths)
+        )
+        doc_lengths = np.array(doc_lengths, dtype=np.int64)
+        doc_idx = np.repeat(np.arange(n_docs), doc_lengths)
+
+        term_frequency = np.bincount(token_ids, minlength=n_words)
+        # Every distinct (document, word) pair adds 1 to the document frequency of the word
+        doc_word_pairs = np.unique(doc_idx * n_words + token_ids)
+        document_frequency = np.bincount(doc_word_pairs % max(n_words, 1), minlength=n_words)
+
+        keep = self._prune(term_frequency, document_frequency, n_docs)
+
+        # Final ids follow the sorted order of the kept words, like Corpus.from_documents
+        kept = np.flatnonzero(keep)
+        kept = kept[np.argsort([words[i] for i in kept], kind="stable")]
+        remap = np.full(n_words, -1, dtype=np.int64)
+        remap[kept] = np.arange(len(kept))
+
+        self.vocabulary = [words[i] for i in kept]
+        self.word_to_id = {word: i for i, word in enumerate(self.vocabulary)}
+        self.term_frequency = term_frequency[kept]
+        self.document_frequency = document_frequency[kept]
+
+        new_ids = remap[token_ids]
+        is_kept = new_ids >= 0
+        doc_offsets = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc_idx[is_kept], minlength=n_docs), out=doc_offsets[1:])
+        return Corpus(doc_ids, self.vocabulary, new_ids[is_kept], doc_offsets)
+
+    def transform(self, doc_to_tokens: Dict[Hashable, List[str]]) -> Corpus:
+        """Encode documents against the fitted vocabulary, dropping words outside of it
+
+        :param doc_to_tokens: Dictionary mapping document identifiers (titles) to their tokens
+        :return: The encoded corpus
+        """
+        return Corpus.from_documents(
+            {
+                doc: [word for word in tokens if word in self.word_to_id]
+                for doc, tokens in doc_to_tokens.items()
+            },
+            self.vocabulary,
+        )
+
+    def _prune(
+        self, term_frequency: np.ndarray, document_frequency: np.ndarray, n_docs: int
+    ) -> np.ndarray:
+        """Mask of the words passing every pruning criterion"""
+        min_df = self.min_df * n_docs if isinstance(self.min_df, float) else self.min_df
+        max_df = self.max_df * n_docs if isinstance(self.max_df, float) else self.max_df
+
+        keep = (
+            (term_frequency >= self.min_count)
+            & (document_frequency >= min_df)
+            & (document_frequency <= max_df)
+        )
+        if self.keep_top_n is not None and keep.sum() > self.keep_top_n:
+            candidates = np.flatnonzero(keep)
+            # Most frequent first, ties broken by first occurrence
+            top = candidates[np.argsort(-term_frequency[candidates], kind="stable")]
+            keep[:] = False
+            keep[top[: self.keep_top_n]] = True
+        return keep
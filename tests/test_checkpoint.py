@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from collapsed_lda.checkpoint import load_checkpoint, save_checkpoint
+from collapsed_lda.lda import LatentDirichletAllocation
+
+
+def make_lda():
+    rng = np.random.default_rng(0)
+    doc_to_tokens = {f"doc_{d}": [f"word_{w}" for w in rng.integers(0, 40, 30)] for d in range(30)}
+    return LatentDirichletAllocation(doc_to_tokens, K=8, verbose=False, random_state=1)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / "checkpoint.npz"
+    arrays = {"counts": np.arange(6, dtype=np.uint16).reshape(2, 3)}
+    save_checkpoint(path, arrays, {"iteration": 4, "best": -np.inf})
+
+    loaded_arrays, metadata = load_checkpoint(path)
+    assert loaded_arrays["counts"].dtype == np.uint16
+    assert np.array_equal(loaded_arrays["counts"], arrays["counts"])
+    assert metadata["iteration"] == 4
+    assert metadata["best"] == -np.inf
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize(
+    "sampler, sampler_options",
+    [("standard", None), ("sparse", None), ("ftree", None), ("alias", {"rebuild_every": 1})],
+)
+def test_resume_continues_the_chain(tmp_path, monkeypatch, sampler, sampler_options):
+    # Alias tables rebuilt before every draw hold no state across sweeps
+    fit_args = dict(
+        n_iter=6,
+        sampler=sampler,
+        sampler_options=sampler_options,
+        burn_in=1,
+        thin=2,
+        eval_every=1,
+    )
+    uninterrupted = make_lda()
+    uninterrupted.fit(**fit_args)
+
+    # Crash during the 5th sweep, after the checkpoint of iteration 4
+    path = tmp_path / "checkpoint.npz"
+    crashing = make_lda()
+    n_sweeps = 0
+    original_sweep = crashing._sweep
+
+    def crashing_sweep(gibbs_sampler):
+        nonlocal n_sweeps
+        n_sweeps += 1
+        if n_sweeps == 5:
+            raise KeyboardInterrupt
+        original_sweep(gibbs_sampler)
+
+    monkeypatch.setattr(crashing, "_sweep", crashing_sweep)
+    with pytest.raises(KeyboardInterrupt):
+        crashing.fit(**fit_args, checkpoint_path=path, checkpoint_every=2)
+
+    resumed = LatentDirichletAllocation.resume(path)
+    assert resumed.n_iter_ == 6
+    assert np.array_equal(resumed.corpus.topics, uninterrupted.corpus.topics)
+    assert resumed.document_word_topics == uninterrupted.document_word_topics
+    assert np.array_equal(resumed.phi_matrix, uninterrupted.phi_matrix)
+    assert np.array_equal(resumed.theta_matrix, uninterrupted.theta_matrix)
+    assert resumed.history_["log_likelihood"] == uninterrupted.history_["log_likelihood"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from collapsed_lda.corpus import Corpus
+
+# Test Corpus.from_documents()
+
+
+def test_from_documents_sorts_vocabulary():
+    corpus = Corpus.from_documents({"doc": ["charlie", "alpha", "bravo"]})
+    assert corpus.vocabulary == ["alpha", "bravo", "charlie"]
+    assert corpus.word_to_id == {"alpha": 0, "bravo": 1, "charlie": 2}
+
+
+def test_from_documents_flat_layout():
+    corpus = Corpus.from_documents({"doc_1": ["b", "a", "b"], "doc_2": [], "doc_3": ["c"]})
+    assert corpus.token_ids.dtype == np.int32
+    assert corpus.token_ids.tolist() == [1, 0, 1, 2]
+    assert corpus.doc_offsets.tolist() == [0, 3, 3, 4]
+    assert corpus.topics.shape == corpus.token_ids.shape
+
+
+def test_tokens_round_trip():
+    doc_to_tokens = {"doc_1": ["alpha", "bravo", "alpha"], "doc_2": ["charlie"]}
+    corpus = Corpus.from_documents(doc_to_tokens)
+    assert [corpus.tokens(d) for d in range(corpus.n_docs)] == list(doc_to_tokens.values())
+
+
+# Test Corpus.add_documents()
+
+
+def test_add_documents_appends_new_words():
+    corpus = Corpus.from_documents({"doc_1": ["bravo", "delta"]})
+    new_words = corpus.add_documents({"doc_2": ["echo", "alpha", "delta"]})
+    assert new_words == ["alpha", "echo"]
+    assert corpus.vocabulary == ["bravo", "delta", "alpha", "echo"]
+    assert corpus.word_to_id["echo"] == 3
+    assert corpus.doc_offsets.tolist() == [0, 2, 5]
+    assert corpus.tokens(1) == ["echo", "alpha", "delta"]
+    assert corpus.topics.shape == corpus.token_ids.shape
+
+
+def test_add_documents_rejects_known_documents():
+    corpus = Corpus.from_documents({"doc_1": ["bravo"]})
+    with pytest.raises(ValueError):
+        corpus.add_documents({"doc_1": ["alpha"]})
+
+
+# Test Corpus.document_view()
+
+
+def test_document_view_slices_flat_array():
+    corpus = Corpus.from_documents({"doc_1": ["b", "a", "b"], "doc_2": [], "doc_3": ["c"]})
+    values = np.array([4, 5, 6, 7], dtype=np.int32)
+    view = corpus.document_view(values)
+    assert view == {"doc_1": [4, 5, 6], "doc_2": [], "doc_3": [7]}
+    assert np.shares_memory(view.view("doc_1"), values)
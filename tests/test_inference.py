@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from collapsed_lda.inference import fold_in, fold_in_kernel, fold_in_vectorized
+from collapsed_lda.lda import LatentDirichletAllocation
+
+
+@pytest.fixture()
+def batch():
+    """Random batch of documents of varying lengths, including an empty one"""
+    rng = np.random.default_rng(0)
+    doc_lengths = np.array([5, 0, 12, 1, 7, 12])
+    doc_offsets = np.concatenate(([0], np.cumsum(doc_lengths)))
+    token_ids = rng.integers(0, 10, doc_offsets[-1]).astype(np.int32)
+    phi_wk = rng.dirichlet(np.ones(10), size=4).T.copy()
+    return token_ids, doc_offsets, phi_wk
+
+
+@pytest.fixture()
+def separated_lda():
+    """Fitted model whose 2 topics have disjoint words"""
+    lda = LatentDirichletAllocation(
+        {"doc_1": ["alpha", "bravo"], "doc_2": ["charlie", "delta"]}, K=2, alpha=0.1, verbose=False
+    )
+    lda.phi_matrix = np.array([[0.5, 0.5, 0.0, 0.0], [0.0, 0.0, 0.5, 0.5]])
+    lda._fitted = True
+    return lda
+
+
+def test_vectorized_fold_in_matches_kernel(batch):
+    token_ids, doc_offsets, phi_wk = batch
+    uniforms = np.random.default_rng(1).random(4 * len(token_ids))
+    results = []
+    for fold_in_func in (fold_in_kernel, fold_in_vectorized):
+        sum_n_dk = np.zeros((len(doc_offsets) - 1, 4))
+        fold_in_func(token_ids, doc_offsets, phi_wk, 0.5, 4, 1, uniforms, sum_n_dk)
+        results.append(sum_n_dk)
+    assert np.array_equal(results[0], results[1])
+    # 3 sweeps are kept
+    assert np.array_equal(results[0].sum(axis=1), 3 * np.diff(doc_offsets))
+
+
+def test_numba_fold_in_matches_python(batch):
+    pytest.importorskip("numba")
+    token_ids, doc_offsets, phi_wk = batch
+    theta_python = fold_in(token_ids, doc_offsets, phi_wk, 0.5, 4, 1, seed=2, backend="python")
+    theta_numba = fold_in(token_ids, doc_offsets, phi_wk, 0.5, 4, 1, seed=2, backend="numba")
+    assert np.array_equal(theta_python, theta_numba)
+
+
+def test_transform_assigns_words_to_their_topic(separated_lda):
+    theta = separated_lda.transform({"new_1": ["alpha", "bravo", "alpha"], "new_2": ["delta"]})
+    assert theta.shape == (2, 2)
+    assert np.allclose(theta.sum(axis=0), 1)
+    assert np.allclose(theta[:, 0], [(3 + 0.1) / 3.2, 0.1 / 3.2])
+    assert np.allclose(theta[:, 1], [0.1 / 1.2, (1 + 0.1) / 1.2])
+
+
+def test_transform_requires_a_fitted_model():
+    lda = LatentDirichletAllocation({"doc_1": ["alpha", "bravo"]}, K=2, verbose=False)
+    with pytest.raises(ValueError):
+        lda.transform([["alpha"]])
+
+
+def test_transform_follows_reassigned_phi_matrix(separated_lda):
+    separated_lda.transform([["alpha"]])
+    separated_lda.phi_matrix = separated_lda.phi_matrix[::-1].copy()
+    theta = separated_lda.transform([["alpha", "bravo", "alpha"]])
+    assert np.allclose(theta[:, 0], [0.1 / 3.2, (3 + 0.1) / 3.2])
+
+
+def test_transform_drops_out_of_vocabulary_words(separated_lda):
+    theta = separated_lda.transform([["unseen", "words"], ["alpha", "unseen"]])
+    assert np.allclose(theta[:, 0], [0.5, 0.5])
+    assert np.allclose(theta[:, 1], [1.1 / 1.2, 0.1 / 1.2])
+
+
+def test_transform_does_not_depend_on_n_jobs():
+    rng = np.random.default_rng(3)
+    doc_to_tokens = {d: [f"word_{w}" for w in rng.integers(0, 10, 8)] for d in range(10)}
+    thetas = []
+    for n_jobs in (1, 2):
+        lda = LatentDirichletAllocation(doc_to_tokens, K=3, verbose=False, random_state=4)
+        lda.fit(n_iter=5)
+        thetas.append(lda.transform(doc_to_tokens, batch_size=3, n_jobs=n_jobs))
+    assert np.array_equal(thetas[0], thetas[1])
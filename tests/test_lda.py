@@ -1,21 +1,19 @@
+from statistics import mode
+
 import numpy as np
+import pytest
+
+from collapsed_lda.lda import LatentDirichletAllocation
 
 # Test LatentDirichletAllocation._compute_phi_estimates()
 
 
 def test_compute_phi_estimates_expected_shape(lda):
     # Act
-    word_topic_counts = {
-        "alpha": {0: 2, 1: 0},
-        "bravo": {0: 0, 1: 1},
-        "charlie": {0: 1, 1: 0},
-        "delta": {0: 0, 1: 1},
-        "echo": {0: 1, 1: 0},
-    }
-    total_topic_counts = {0: 4, 1: 2}
-    lda._compute_phi_estimates(
-        word_topic_counts=word_topic_counts, total_topic_counts=total_topic_counts
-    )
+    # Rows indexed by word id: alpha, bravo, charlie, delta, echo
+    n_wk = np.array([[2, 0], [0, 1], [1, 0], [0, 1], [1, 0]])
+    n_k = np.array([4, 2])
+    lda._compute_phi_estimates(n_wk=n_wk, n_k=n_k)
     test_phi = lda.phi_matrix
 
     # Assert
@@ -24,17 +22,10 @@ def test_compute_phi_estimates_expected_shape(lda):
 
 def test_compute_phi_estimates_expected_values(lda):
     # Act
-    word_topic_counts = {
-        "alpha": {0: 2, 1: 0},
-        "bravo": {0: 0, 1: 1},
-        "charlie": {0: 1, 1: 0},
-        "delta": {0: 0, 1: 1},
-        "echo": {0: 1, 1: 0},
-    }
-    total_topic_counts = {0: 4, 1: 2}
-    lda._compute_phi_estimates(
-        word_topic_counts=word_topic_counts, total_topic_counts=total_topic_counts
-    )
+    # Rows indexed by word id: alpha, bravo, charlie, delta, echo
+    n_wk = np.array([[2, 0], [0, 1], [1, 0], [0, 1], [1, 0]])
+    n_k = np.array([4, 2])
+    lda._compute_phi_estimates(n_wk=n_wk, n_k=n_k)
     test_phi = lda.phi_matrix
     # Hand-computed following from formula
     W_Beta = lda.W * lda.beta
@@ -63,8 +54,8 @@ def test_compute_phi_estimates_expected_values(lda):
 
 
 def test_compute_theta_estimates_has_correct_shape(lda):
-    doc_topic_counts = {"doc_1": {}, "doc_2": {}}
-    lda._compute_theta_estimates(document_topic_counts=doc_topic_counts)
+    doc_topic_counts = np.zeros((2, lda.K), dtype=int)
+    lda._compute_theta_estimates(n_dk=doc_topic_counts)
 
     test_theta = lda.theta_matrix
     expected_shape = (lda.K, len(doc_topic_counts))
@@ -72,8 +63,8 @@ def test_compute_theta_estimates_has_correct_shape(lda):
 
 
 def test_compute_theta_estimates_has_correct_values(lda):
-    doc_topic_counts = {"doc_1": {0: 5, 1: 2}, "doc_2": {0: 1, 1: 8}}
-    lda._compute_theta_estimates(document_topic_counts=doc_topic_counts)
+    doc_topic_counts = np.array([[5, 2], [1, 8]])
+    lda._compute_theta_estimates(n_dk=doc_topic_counts)
 
     K_alpha = lda.K * lda.alpha
     expected_theta = np.array(
@@ -86,19 +77,228 @@ def test_compute_theta_estimates_has_correct_values(lda):
     assert np.allclose(test_theta, expected_theta)
 
 
+def test_estimates_use_estimate_dtype():
+    lda = LatentDirichletAllocation({"doc": ["alpha", "bravo"]}, K=2, estimate_dtype=np.float32)
+    lda._compute_phi_estimates(n_wk=np.array([[1, 0], [0, 1]]), n_k=np.array([1, 1]))
+    lda._compute_theta_estimates(n_dk=np.array([[1, 1]]))
+    assert lda.phi_matrix.dtype == np.float32
+    assert lda.theta_matrix.dtype == np.float32
+    assert np.allclose(lda.theta_matrix, 0.5)
+
+
+def test_fit_default_sampler_matches_reference():
+    doc_to_tokens = {
+        f"doc_{d}": ["alpha", "bravo", "charlie", "delta"][d % 3 :] * 3 for d in range(6)
+    }
+    default = LatentDirichletAllocation(doc_to_tokens, K=3, random_state=0, verbose=False)
+    default.fit(n_iter=3)
+    reference = LatentDirichletAllocation(doc_to_tokens, K=3, random_state=0, verbose=False)
+    reference.fit(n_iter=3, sampler="standard")
+    assert np.array_equal(default.corpus.topics, reference.corpus.topics)
+
+
+def test_fit_can_skip_theta(lda):
+    lda.fit(n_iter=2, compute_theta=False)
+    assert lda.theta_matrix is None
+    assert np.allclose(lda.phi_matrix.sum(axis=1), 1)
+
+
+# Test LatentDirichletAllocation._count_topics()
+
+
+def test_count_topics_gives_correct_values(lda):
+    # Corpus is [alpha, bravo, charlie], [alpha, delta, echo]
+    topics = np.array([0, 1, 1, 1, 0, 0])
+    n_dk, n_wk, n_k = lda._count_topics(topics)
+    assert n_dk.tolist() == [[1, 2], [2, 1]]
+    assert n_wk.tolist() == [[1, 1], [0, 1], [0, 1], [1, 0], [1, 0]]
+    assert n_k.tolist() == [3, 3]
+
+
+def test_count_topics_uses_count_dtype():
+    lda = LatentDirichletAllocation({"doc": ["alpha", "bravo"]}, K=2, count_dtype=np.uint16)
+    n_dk, n_wk, _ = lda._count_topics(np.array([0, 1]))
+    assert n_dk.dtype == np.uint16
+    assert n_wk.dtype == np.uint16
+
+
 # Test LatentDirichletAllocation._compute_MC_topic_approx()
 
 
+def tally_chains(lda, word_topics_MC):
+    """Feed flat per-token chains through the running topic tally, one state at a time"""
+    n_samples = len(word_topics_MC[0])
+    topic_tally = lda._new_topic_tally(n_samples)
+    for sample, topics in enumerate(zip(*word_topics_MC)):
+        lda.corpus.topics[:] = topics
+        lda._update_topic_tally(topic_tally, sample)
+    return topic_tally
+
+
 def test_compute_mc_topic_approx_gives_correct_values(lda):
-    # 3 words in Doc 0, 2 words in Doc 1. Run for 3 iterations
-    word_topics_MC = {
-        "doc_0": [[1, 0, 1], [1, 1, 0], [1, 0, 0]],
-        "doc_1": [[0, 0, 0], [0, 0, 1]],
-    }
-    expected_topics = {"doc_0": [1, 1, 0], "doc_1": [0, 0]}
-    lda._compute_MC_topic_approx(document_word_topics_MC=word_topics_MC)
+    # 3 words in each doc, chains are flat over the corpus. Run for 3 iterations
+    word_topics_MC = [[1, 0, 1], [1, 1, 0], [1, 0, 0], [0, 0, 0], [0, 0, 1], [1, 1, 1]]
+    expected_topics = {"doc_1": [1, 1, 0], "doc_2": [0, 0, 1]}
+    lda._compute_MC_topic_approx(tally_chains(lda, word_topics_MC))
     test_topics = lda.document_word_topics
     assert test_topics == expected_topics
+    assert lda.token_topics.tolist() == [1, 1, 0, 0, 0, 1]
+
+
+def test_compute_mc_topic_approx_matches_mode_of_chain():
+    lda = LatentDirichletAllocation({"doc": ["alpha"] * 200}, K=5)
+    rng = np.random.default_rng(0)
+    word_topics_MC = rng.integers(0, 5, size=(200, 300)).tolist()
+    lda._compute_MC_topic_approx(tally_chains(lda, word_topics_MC))
+    assert lda.document_word_topics["doc"] == [mode(chain) for chain in word_topics_MC]
+
+
+def test_fit_without_mode_tracking_keeps_final_topics(lda):
+    lda.fit(n_iter=3, track_modes=False)
+    topics = lda.corpus.topics.tolist()
+    assert lda.token_topics.tolist() == topics
+    assert lda.document_word_topics == {"doc_1": topics[:3], "doc_2": topics[3:]}
+
+
+def test_fit_leaves_burn_in_out_of_mode(lda):
+    lda.fit(n_iter=3, burn_in=3)
+    # With every state but the last burned in, the mode is the final assignment
+    topics = lda.corpus.topics.tolist()
+    assert lda.document_word_topics == {"doc_1": topics[:3], "doc_2": topics[3:]}
+
+
+def test_fit_estimates_theta_from_mean_of_thinned_samples(lda, monkeypatch):
+    # Replace the sampler by a sweep stepping n_dk through known states, keeping the 3 tokens of each document
+    states = iter(
+        [np.array([[3, 0], [0, 3]]), np.array([[0, 3], [3, 0]]), np.array([[1, 2], [2, 1]])]
+    )
+
+    def fake_sweep(gibbs_sampler):
+        lda.n_dk = next(states)
+
+    monkeypatch.setattr(lda, "_sweep", fake_sweep)
+    lda.fit(n_iter=3, burn_in=1, thin=2)
+
+    # States 1 and 3 are sampled
+    expected_n_dk = np.array([[2, 1], [1, 2]])
+    K_alpha = lda.K * lda.alpha
+    assert np.allclose(lda.theta_matrix, (expected_n_dk.T + lda.alpha) / (3 + K_alpha))
+
+
+def test_fit_estimates_from_final_state_by_default(lda):
+    lda.fit(n_iter=5)
+    final = LatentDirichletAllocation(lda.corpus, K=lda.K, alpha=lda.alpha, beta=lda.beta)
+    final._compute_phi_estimates(lda.n_wk, lda.n_k)
+    final._compute_theta_estimates(lda.n_dk)
+    assert np.allclose(lda.phi_matrix, final.phi_matrix)
+    assert np.allclose(lda.theta_matrix, final.theta_matrix)
+
+
+def test_fit_rejects_invalid_thin(lda):
+    with pytest.raises(ValueError):
+        lda.fit(n_iter=3, thin=0)
+
+
+# Test LatentDirichletAllocation._initialize_topics()
+
+
+def test_incremental_init_gives_consistent_counts(lda):
+    counts = lda._initialize_topics(init="incremental")
+    for count, expected in zip(counts, lda._count_topics(lda.corpus.topics)):
+        assert np.array_equal(count, expected)
+
+
+def test_init_from_previous_phi(lda):
+    # alpha and charlie only occur in topic 1, bravo in topic 0, delta and echo are unknown
+    phi_matrix = np.array([[0.0, 1.0, 0.0], [0.5, 0.0, 0.5]])
+    lda._initialize_topics(init=(phi_matrix, ["charlie", "bravo", "alpha"]))
+    assert lda.corpus.topics[:4].tolist() == [1, 0, 1, 1]
+
+    # Unknown words are drawn uniformly
+    unknown_topics = [lda._draw_topics_from_phi(phi_matrix, ["x", "y", "z"]) for _ in range(200)]
+    assert 0.35 < np.mean(unknown_topics) < 0.65
+
+
+def test_init_rejects_mismatched_phi(lda):
+    with pytest.raises(ValueError):
+        lda._initialize_topics(init=(np.ones((3, 2)), ["alpha", "bravo"]))
+
+
+# Test LatentDirichletAllocation.log_likelihood()
+
+
+def test_log_likelihood_matches_chain_rule(lda):
+    # p(w, z) is the product of the predictive probabilities of adding the tokens one at a time
+    topics = np.array([0, 1, 1, 1, 0, 0])
+    lda.n_dk, lda.n_wk, lda.n_k = lda._count_topics(topics)
+
+    n_dk, n_wk, n_k = np.zeros((2, lda.K)), np.zeros((lda.W, lda.K)), np.zeros(lda.K)
+    expected = 0.0
+    for i, (word, topic) in enumerate(zip(lda.corpus.token_ids, topics)):
+        d = i // 3
+        expected += np.log((n_dk[d, topic] + lda.alpha) / (n_dk[d].sum() + lda.K * lda.alpha))
+        expected += np.log((n_wk[word, topic] + lda.beta) / (n_k[topic] + lda.W * lda.beta))
+        n_dk[d, topic] += 1
+        n_wk[word, topic] += 1
+        n_k[topic] += 1
+
+    assert np.isclose(lda.log_likelihood(), expected)
+
+
+def test_fit_records_history(lda):
+    lda.fit(n_iter=6, eval_every=2)
+    assert lda.history_["iteration"] == [2, 4, 6]
+    assert len(lda.history_["log_likelihood"]) == 3
+    assert lda.history_["log_likelihood"][-1] == lda.log_likelihood()
+
+
+def test_fit_stops_early_without_improvement(lda):
+    # No improvement can be large enough
+    lda.fit(n_iter=100, eval_every=1, tol=np.inf, patience=3)
+    assert lda.n_iter_ == 4
+    assert len(lda.document_word_topics["doc_1"]) == 3
+
+
+def test_fit_stops_at_time_budget(lda):
+    lda.fit(n_iter=100, burn_in=50, time_budget=0)
+    assert lda.n_iter_ == 1
+    assert all(0 <= topic < lda.K for topic in lda.document_word_topics["doc_1"])
+
+
+# Test LatentDirichletAllocation.partial_fit()
+
+
+@pytest.mark.parametrize("rejuvenation", [0.0, 0.5])
+def test_partial_fit_adds_documents(lda, rejuvenation):
+    lda.verbose = False
+    lda.fit(n_iter=3)
+    old_topics = lda.corpus.topics.copy()
+    old_word_topics = dict(lda.document_word_topics)
+
+    lda.partial_fit(
+        {"doc_3": ["alpha", "foxtrot", "foxtrot"], "doc_4": ["golf"]},
+        n_iter=3,
+        rejuvenation=rejuvenation,
+    )
+
+    assert lda.vocabulary[-2:] == ["foxtrot", "golf"]
+    assert lda.phi_matrix.shape == (lda.K, 7)
+    assert lda.theta_matrix.shape == (lda.K, 4)
+    assert np.allclose(lda.phi_matrix.sum(axis=1), 1)
+    expected_counts = lda._count_topics(lda.corpus.topics)
+    for count, expected in zip((lda.n_dk, lda.n_wk, lda.n_k), expected_counts):
+        assert np.array_equal(count, expected)
+
+    assert list(lda.document_word_topics) == ["doc_1", "doc_2", "doc_3", "doc_4"]
+    assert len(lda.document_word_topics["doc_3"]) == 3
+    assert lda.document_word_topics["doc_1"] == old_word_topics["doc_1"]
+    if rejuvenation == 0:
+        assert np.array_equal(lda.corpus.topics[:6], old_topics)
+
+
+def test_partial_fit_requires_fitted_model(lda):
+    with pytest.raises(ValueError):
+        lda.partial_fit({"doc_3": ["alpha"]}, n_iter=1)
 
 
 # Test LatentDirichletAllocation.get_top_n_words()
@@ -125,3 +325,33 @@ def test_get_top_n_words_gives_expected_prob(lda):
     test_top_words = lda.get_top_n_words(n=1, return_probs=True)
     test_probs = {k: word_info[0][1] for k, word_info in test_top_words.items()}
     assert test_probs == {0: 0.8, 1: 0.8}
+
+
+# Test LatentDirichletAllocation.top_words() and top_documents()
+
+
+def test_top_words_ranks_by_phi(lda):
+    lda.phi_matrix = np.array([[0.1, 0.4, 0.2, 0.25, 0.05], [0.3, 0.05, 0.1, 0.15, 0.4]])
+    assert lda.top_words(3) == {0: ["bravo", "delta", "charlie"], 1: ["echo", "alpha", "delta"]}
+    assert lda.top_words(1, return_probs=True) == {0: [("bravo", 0.4)], 1: [("echo", 0.4)]}
+    assert lda.top_words(10)[0] == ["bravo", "delta", "charlie", "alpha", "echo"]
+
+
+def test_top_words_cache_is_cleared_on_new_phi(lda):
+    lda.phi_matrix = np.array([[0.8, 0.05, 0.05, 0.05, 0.05], [0.05, 0.05, 0.05, 0.05, 0.8]])
+    assert lda.top_words(1) == {0: ["alpha"], 1: ["echo"]}
+    lda.phi_matrix = lda.phi_matrix[::-1]
+    assert lda.top_words(1) == {0: ["echo"], 1: ["alpha"]}
+
+
+def test_top_words_relevance_favours_specific_words(lda):
+    # alpha is likely in both topics, charlie only in topic 0
+    lda.phi_matrix = np.array([[0.5, 0.05, 0.35, 0.05, 0.05], [0.5, 0.2, 0.01, 0.09, 0.2]])
+    assert lda.top_words(1, relevance_lambda=1.0)[0] == ["alpha"]
+    assert lda.top_words(1, relevance_lambda=0.0)[0] == ["charlie"]
+
+
+def test_top_documents_ranks_by_theta(lda):
+    lda.theta_matrix = np.array([[0.2, 0.7], [0.8, 0.3]])
+    assert lda.top_documents(0, 2) == ["doc_2", "doc_1"]
+    assert lda.top_documents(1, 1, return_probs=True) == [("doc_1", 0.8)]
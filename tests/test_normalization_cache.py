@@ -0,0 +1,68 @@
+import pytest
+
+from collapsed_lda.utility.normalization_cache import NormalizationCache
+from collapsed_lda.utility.utility import stem_tokens
+
+
+class CountingStemmer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, word):
+        self.calls.append(word)
+        return word.rstrip("s")
+
+
+def test_normalize_all_normalizes_each_word_once():
+    cache = NormalizationCache()
+    stemmer = CountingStemmer()
+    assert cache.normalize_all(["cats", "dogs", "cats"], stemmer) == ["cat", "dog", "cat"]
+    assert cache.normalize_all(["dogs", "cats"], stemmer) == ["dog", "cat"]
+    assert stemmer.calls == ["cats", "dogs"]
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = NormalizationCache(maxsize=2)
+    cache.normalize_all(["a", "b", "c"], str.upper)
+    assert len(cache) == 2
+    assert "a" not in cache
+    assert cache.get("c") == "C"
+
+    # Hits refresh an entry, so the frequent word survives
+    stemmer = CountingStemmer()
+    cache = NormalizationCache(maxsize=2)
+    cache.normalize_all(["the", "cats", "the", "dogs", "the", "rats", "the"], stemmer)
+    assert stemmer.calls == ["the", "cats", "dogs", "rats"]
+    assert "the" in cache
+
+
+def test_pop_added_returns_new_entries_only():
+    cache = NormalizationCache()
+    cache.add("old", "old")
+    cache.track_added()
+    cache.normalize_all(["old", "new"], str.upper)
+    assert cache.pop_added() == {"new": "NEW"}
+    assert cache.pop_added() == {}
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    cache = NormalizationCache()
+    cache.add("running", "run")
+    cache.add(("saw", "VBD"), "see")
+    path = tmp_path / "cache.json"
+    cache.save(path)
+
+    loaded = NormalizationCache.load(path)
+    assert loaded.get("running") == "run"
+    assert loaded.get(("saw", "VBD")) == "see"
+
+
+def test_invalid_maxsize_raises():
+    with pytest.raises(ValueError):
+        NormalizationCache(maxsize=0)
+
+
+def test_stem_tokens_fills_given_cache():
+    cache = NormalizationCache()
+    assert stem_tokens(["running", "jumps", "running"], cache=cache) == ["run", "jump", "run"]
+    assert len(cache) == 2
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.parallel import partition_documents
+
+# Test partition_documents()
+
+
+def test_partition_documents_covers_all_documents():
+    doc_offsets = np.array([0, 5, 6, 20, 21, 30, 40])
+    shards = partition_documents(doc_offsets, 3)
+    assert shards[0][0] == 0
+    assert shards[-1][1] == 6
+    assert all(end == start for (_, end), (start, _) in zip(shards[:-1], shards[1:]))
+
+
+def test_partition_documents_balances_tokens():
+    doc_offsets = np.arange(0, 101, 10)
+    assert partition_documents(doc_offsets, 2) == [(0, 5), (5, 10)]
+
+
+# Test LatentDirichletAllocation.fit(n_jobs=...)
+
+
+@pytest.mark.parametrize("count_dtype", [np.int32, np.uint16])
+def test_parallel_fit_keeps_counts_consistent(count_dtype):
+    rng = np.random.default_rng(0)
+    doc_to_tokens = {
+        d: [f"word_{w}" for w in rng.integers(0, 30, size=rng.integers(5, 40))] for d in range(20)
+    }
+    lda = LatentDirichletAllocation(
+        doc_to_tokens, K=4, verbose=False, random_state=0, count_dtype=count_dtype
+    )
+    lda.fit(n_iter=3, n_jobs=2)
+
+    n_dk, n_wk, n_k = lda._count_topics(lda.corpus.topics)
+    assert np.array_equal(lda.n_dk, n_dk)
+    assert np.array_equal(lda.n_wk, n_wk)
+    assert np.array_equal(lda.n_k, n_k)
+    # Shared memory is released and the state copied back into regular arrays
+    assert lda.n_wk.base is None
+
+
+@pytest.mark.parametrize("sampler", ["sparse", "ftree"])
+def test_parallel_fit_with_persistent_lists_keeps_counts_consistent(sampler):
+    # Shards hold disjoint words, so each worker only copies and lists its own rows of n_wk
+    doc_to_tokens = {d: [f"word_{d // 4}_{w}" for w in range(d % 4, 12)] for d in range(12)}
+    lda = LatentDirichletAllocation(doc_to_tokens, K=4, verbose=False, random_state=0)
+    lda.fit(n_iter=3, n_jobs=3, sampler=sampler)
+
+    n_dk, n_wk, n_k = lda._count_topics(lda.corpus.topics)
+    assert np.array_equal(lda.n_dk, n_dk)
+    assert np.array_equal(lda.n_wk, n_wk)
+    assert np.array_equal(lda.n_k, n_k)
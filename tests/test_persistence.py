@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.persistence import FORMAT_VERSION, current_version
+
+
+@pytest.fixture()
+def fitted_lda(lda):
+    lda.verbose = False
+    lda.fit(n_iter=5)
+    return lda
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(fitted_lda, tmp_path, mmap):
+    fitted_lda.save(tmp_path / "model")
+    loaded = LatentDirichletAllocation.load(tmp_path / "model", mmap=mmap, verbose=False)
+
+    assert isinstance(loaded.phi_matrix, np.memmap) == mmap
+    assert np.array_equal(loaded.phi_matrix, fitted_lda.phi_matrix)
+    assert np.array_equal(loaded.theta_matrix, fitted_lda.theta_matrix)
+    assert loaded.vocabulary == fitted_lda.vocabulary
+    assert loaded.corpus.doc_ids == fitted_lda.corpus.doc_ids
+    assert (loaded.K, loaded.alpha, loaded.beta) == (
+        fitted_lda.K,
+        fitted_lda.alpha,
+        fitted_lda.beta,
+    )
+    assert loaded.get_top_n_words(2) == fitted_lda.get_top_n_words(2)
+
+
+def test_loaded_model_transforms_without_copying_phi(fitted_lda, tmp_path):
+    fitted_lda.save(tmp_path / "model")
+    loaded = LatentDirichletAllocation.load(tmp_path / "model", random_state=0)
+
+    assert loaded.phi_matrix.T.flags.c_contiguous
+    theta = loaded.transform([["alpha", "bravo"], ["echo"]])
+    assert theta.shape == (2, 2)
+    assert np.shares_memory(loaded._phi_wk, loaded.phi_matrix)
+
+
+def test_save_over_served_model_keeps_mapped_files(fitted_lda, tmp_path):
+    fitted_lda.save(tmp_path / "model")
+    served = LatentDirichletAllocation.load(tmp_path / "model", mmap=True, verbose=False)
+    old_phi = np.array(fitted_lda.phi_matrix)
+
+    fitted_lda.phi_matrix = old_phi[::-1].copy()
+    fitted_lda.save(tmp_path / "model")
+    assert np.array_equal(served.phi_matrix, old_phi)
+
+    reloaded = LatentDirichletAllocation.load(tmp_path / "model", verbose=False)
+    assert np.array_equal(reloaded.phi_matrix, old_phi[::-1])
+
+
+def test_save_keeps_current_and_previous_version(fitted_lda, tmp_path):
+    for _ in range(3):
+        fitted_lda.save(tmp_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["CURRENT", "v000002", "v000003"]
+    assert current_version(tmp_path) == str(tmp_path / "v000003")
+
+
+def test_load_rejects_unknown_format_version(fitted_lda, tmp_path):
+    fitted_lda.save(tmp_path)
+    manifest_path = tmp_path / current_version(tmp_path) / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["format_version"] = FORMAT_VERSION + 1
+    manifest_path.write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError):
+        LatentDirichletAllocation.load(tmp_path)
+
+
+def test_load_without_current_version_raises(fitted_lda, tmp_path):
+    fitted_lda.save(tmp_path)
+    (tmp_path / "CURRENT").unlink()
+    with pytest.raises(FileNotFoundError, match="CURRENT"):
+        LatentDirichletAllocation.load(tmp_path)
@@ -0,0 +1,49 @@
+import pytest
+
+from collapsed_lda.utility.preprocessor import Preprocessor
+from collapsed_lda.utility.utility import stem_tokens, tokenize_doc
+
+
+@pytest.fixture()
+def preprocessor():
+    return Preprocessor(stop_words=["the", "and", "of"], extra_words=["said"])
+
+
+def test_process_runs_pipeline(preprocessor):
+    doc = "The Banks said: rates of 5 percent\nand rising\x03"
+    assert preprocessor.process(doc) == ["bank", "rate", "percent", "rise"]
+
+
+def test_process_matches_utility_functions(preprocessor):
+    doc = "Running, jumped\tand swimming! Cats' toys"
+    expected = stem_tokens([t for t in tokenize_doc(doc) if t not in {"the", "and", "of", "said"}])
+    assert preprocessor.process(doc) == expected
+
+
+def test_process_keeps_numbers_and_skips_stemming():
+    preprocessor = Preprocessor(stop_words=[], remove_numbers=False, stem=False)
+    assert preprocessor.process("Rising 42 rates") == ["rising", "42", "rates"]
+
+
+def test_process_removes_quotes():
+    preprocessor = Preprocessor(stop_words=["don't"], tokens_have_quotes=True, stem=False)
+    assert preprocessor.tokenize("Don't") == ["dont"]
+    assert preprocessor.process("Don't stop") == ["stop"]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_process_many_keeps_keys_and_order(preprocessor, n_jobs):
+    docs = {f"doc_{i}": f"rates rising {i} times" for i in range(20)}
+    processed = preprocessor.process_many(docs, n_jobs=n_jobs, chunksize=3)
+    assert list(processed) == list(docs)
+    assert processed["doc_3"] == ["rate", "rise", "time"]
+    assert preprocessor.process_many(list(docs.values()), n_jobs=n_jobs) == list(
+        processed.values()
+    )
+
+
+def test_process_many_merges_worker_stems(preprocessor):
+    docs = [f"rates rising {i} times" for i in range(20)]
+    preprocessor.process_many(docs, n_jobs=2, chunksize=3)
+    assert preprocessor.stem_cache.get("rising") == "rise"
+    assert len(preprocessor.stem_cache) == 3
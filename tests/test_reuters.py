@@ -0,0 +1,83 @@
+import pytest
+
+from collapsed_lda.utility.reuters import iter_reuters, iter_sgm_file, parse_article
+from collapsed_lda.utility.utility import parse_sgm_file
+
+ARTICLE = """<REUTERS TOPICS="YES" LEWISSPLIT="TRAIN" OLDID="5544" NEWID="{newid}">
+<DATE>26-FEB-1987 15:01:01.79</DATE>
+<TOPICS><D>cocoa</D></TOPICS>
+<TEXT>&#2;
+<TITLE>{title}</TITLE>
+<DATELINE>    SALVADOR, Feb 26 - </DATELINE><BODY>{body}
+ Reuter
+&#3;</BODY></TEXT>
+</REUTERS>
+"""
+
+BRIEF = """<REUTERS TOPICS="NO" NEWID="7">
+<TEXT TYPE="BRIEF">&#2;
+******<TITLE>BRIEF TITLE</TITLE>
+Blah blah blah.
+&#3;
+
+</TEXT>
+</REUTERS>
+"""
+
+UNPROC = """<REUTERS TOPICS="NO" NEWID="8">
+<TEXT TYPE="UNPROC">&#2;
+FEDERAL RESERVE WEEKLY REPORT &lt;1&gt;
+&#3;</TEXT>
+</REUTERS>
+"""
+
+
+def write_sgm(path, articles):
+    path.write_text('<!DOCTYPE lewis SYSTEM "lewis.dtd">\n' + "".join(articles))
+    return str(path)
+
+
+@pytest.fixture()
+def sgm_paths(tmp_path):
+    return [
+        write_sgm(
+            tmp_path / "reut2-000.sgm",
+            [ARTICLE.format(newid=1, title="COCOA", body="Showers"), BRIEF],
+        ),
+        write_sgm(
+            tmp_path / "reut2-001.sgm",
+            [ARTICLE.format(newid=2, title="COCOA", body="Rain &lt;X&gt;"), UNPROC],
+        ),
+    ]
+
+
+def test_parse_article_reads_id_title_and_body():
+    newid, title, body = parse_article(ARTICLE.format(newid=12, title="A &amp; B", body="Text"))
+    assert newid == 12
+    assert title == "A & B"
+    assert body == "Text\n Reuter\n"
+
+
+def test_parse_article_without_body():
+    assert parse_article(BRIEF) == (7, "BRIEF TITLE", "\n******\nBlah blah blah.\n\n\n")
+    assert parse_article(UNPROC) == (8, None, "\nFEDERAL RESERVE WEEKLY REPORT <1>\n")
+
+
+def test_iter_sgm_file_yields_articles_in_order(sgm_paths):
+    assert [article[0] for article in iter_sgm_file(sgm_paths[1])] == [2, 8]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_iter_reuters_reads_all_files(sgm_paths, tmp_path, n_jobs):
+    articles = list(iter_reuters(str(tmp_path / "reut2-*.sgm"), n_jobs=n_jobs))
+    assert [article[0] for article in articles] == [1, 7, 2, 8]
+    assert articles[2] == (2, "COCOA", "Rain <X>\n Reuter\n")
+
+
+def test_parse_sgm_file_keys_by_title(sgm_paths):
+    with open(sgm_paths[0]) as f:
+        title_docs = parse_sgm_file(f.read())
+    assert title_docs == {
+        "COCOA": "Showers\n Reuter\n",
+        "BRIEF TITLE": "\n******\nBlah blah blah.\n\n\n",
+    }
@@ -0,0 +1,247 @@
+import itertools
+
+import numpy as np
+import pytest
+from scipy.special import gammaln
+
+from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.samplers import _fastlda_draw, _nonzero_topics, get_sampler
+
+
+@pytest.fixture()
+def random_lda():
+    """LDA fixture on a small random corpus with 21 docs, 30 words and 4 topics. The last doc has a single token"""
+    rng = np.random.default_rng(0)
+    doc_to_tokens = {
+        f"doc_{d}": [f"word_{w}" for w in rng.integers(0, 30, size=rng.integers(5, 40))]
+        for d in range(20)
+    }
+    doc_to_tokens["doc_single"] = ["word_3"]
+    return LatentDirichletAllocation(doc_to_tokens, K=4, verbose=False, random_state=0)
+
+
+def run_sweeps(lda, sampler, n_sweeps=3, seed=1, backend="python", **options):
+    """Run a few sweeps of the named sampler from the same initial state, returning the final state"""
+    corpus = lda.corpus
+    n_dk, n_wk, n_k = lda._initialize_topics()
+    topics = corpus.topics.copy()
+    gibbs_sampler = get_sampler(sampler, lda.alpha, lda.beta, backend=backend, **options)
+    rng = np.random.default_rng(seed)
+    for _ in range(n_sweeps):
+        uniforms = rng.random(corpus.n_tokens * gibbs_sampler.uniforms_per_token)
+        gibbs_sampler.sweep(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            np.arange(corpus.n_docs),
+            topics,
+            n_dk,
+            n_wk,
+            n_k,
+            uniforms,
+        )
+    return topics, n_dk, n_wk, n_k
+
+
+def assert_counts_consistent(lda, topics, n_dk, n_wk, n_k):
+    expected_n_dk, expected_n_wk, expected_n_k = lda._count_topics(topics)
+    assert np.array_equal(n_dk, expected_n_dk)
+    assert np.array_equal(n_wk, expected_n_wk)
+    assert np.array_equal(n_k, expected_n_k)
+
+
+# Test get_sampler()
+
+
+def test_get_sampler_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        get_sampler("unknown", alpha=0.1, beta=0.01)
+
+
+def test_get_sampler_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        get_sampler("standard", alpha=0.1, beta=0.01, backend="unknown")
+
+
+# Test sweep kernels
+
+
+@pytest.mark.parametrize(
+    "sampler", ["standard", "vectorized", "fastlda", "sparse", "ftree", "alias"]
+)
+def test_sweep_keeps_counts_consistent(random_lda, sampler):
+    state = run_sweeps(random_lda, sampler)
+    assert_counts_consistent(random_lda, *state)
+
+
+@pytest.mark.parametrize(
+    "sampler", ["standard", "vectorized", "fastlda", "sparse", "ftree", "alias"]
+)
+def test_sweep_supports_unsigned_counts(random_lda, sampler):
+    random_lda.count_dtype = np.dtype(np.uint16)
+    state = run_sweeps(random_lda, sampler)
+    assert state[1].dtype == np.uint16
+    assert_counts_consistent(random_lda, *state)
+
+
+def test_vectorized_sweep_matches_standard(random_lda):
+    random_lda._rng = np.random.default_rng(0)
+    standard_topics, *_ = run_sweeps(random_lda, "standard")
+    random_lda._rng = np.random.default_rng(0)
+    vectorized_topics, *_ = run_sweeps(random_lda, "vectorized")
+    assert np.array_equal(standard_topics, vectorized_topics)
+
+
+@pytest.mark.parametrize(
+    "sampler", ["standard", "vectorized", "fastlda", "sparse", "ftree", "alias"]
+)
+def test_numba_backend_matches_python(random_lda, sampler):
+    pytest.importorskip("numba")
+    random_lda._rng = np.random.default_rng(0)
+    python_state = run_sweeps(random_lda, sampler, backend="python")
+    random_lda._rng = np.random.default_rng(0)
+    numba_state = run_sweeps(random_lda, sampler, backend="numba")
+    for python_array, numba_array in zip(python_state, numba_state):
+        assert np.array_equal(python_array, numba_array)
+
+
+@pytest.mark.parametrize("sampler, counts", [("sparse", 2), ("ftree", 1)])
+def test_nonzero_topics_persist_across_sweeps(random_lda, sampler, counts):
+    corpus = random_lda.corpus
+    n_dk, n_wk, n_k = random_lda._initialize_topics()
+    state = [corpus.topics.copy(), n_dk, n_wk, n_k]
+    gibbs_sampler = get_sampler(sampler, random_lda.alpha, random_lda.beta)
+    rng = np.random.default_rng(1)
+    for _ in range(3):
+        gibbs_sampler.sweep(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            np.arange(corpus.n_docs),
+            *state,
+            rng.random(corpus.n_tokens),
+        )
+    topic_lists, offsets, nnz = _nonzero_topics(state[counts])
+    if sampler == "sparse":
+        lists = gibbs_sampler._word_topics, gibbs_sampler._word_topic_offsets
+        persisted_nnz = gibbs_sampler._word_nnz
+    else:
+        lists = gibbs_sampler._doc_topics, gibbs_sampler._doc_topic_offsets
+        persisted_nnz = gibbs_sampler._doc_nnz
+    assert np.array_equal(persisted_nnz, nnz)
+    for r in range(nnz.shape[0]):
+        persisted = lists[0][lists[1][r] : lists[1][r] + nnz[r]]
+        assert np.array_equal(persisted, topic_lists[offsets[r] : offsets[r] + nnz[r]])
+
+
+@pytest.mark.parametrize("sampler", ["standard", "vectorized", "fastlda", "sparse", "ftree"])
+def test_sweep_draws_from_conditional(random_lda, sampler):
+    # The last document holds a single token, so sweeping it draws exactly once from Eq. 1
+    corpus = random_lda.corpus
+    n_dk, n_wk, n_k = random_lda._initialize_topics()
+    topics = corpus.topics
+    d, i = corpus.n_docs - 1, corpus.n_tokens - 1
+    word = corpus.token_ids[i]
+
+    curr_topic = topics[i]
+    a = n_dk[d] + random_lda.alpha
+    b = n_wk[word] + random_lda.beta
+    c = n_k + random_lda.W * random_lda.beta
+    a[curr_topic] -= 1
+    b[curr_topic] -= 1
+    c[curr_topic] -= 1
+    expected = a * b / c / np.sum(a * b / c)
+
+    # The draw is a deterministic function of u, so a fine grid of u recovers its distribution
+    gibbs_sampler = get_sampler(sampler, random_lda.alpha, random_lda.beta)
+    n_grid = 2000
+    draws = []
+    for j in range(n_grid):
+        state = [topics.copy(), n_dk.copy(), n_wk.copy(), n_k.copy()]
+        gibbs_sampler.sweep(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            np.array([d]),
+            *state,
+            np.array([(j + 0.5) / n_grid]),
+        )
+        draws.append(state[0][i])
+    frequencies = np.bincount(draws, minlength=random_lda.K) / n_grid
+    assert np.allclose(frequencies, expected, atol=2e-3)
+
+
+def test_alias_sweep_samples_posterior():
+    # Tiny corpus whose posterior over all 2^4 topic configurations can be enumerated
+    lda = LatentDirichletAllocation(
+        {"doc_1": ["alpha", "alpha", "bravo"], "doc_2": ["bravo"]},
+        K=2,
+        alpha=0.2,
+        beta=0.1,
+        verbose=False,
+        random_state=0,
+    )
+    corpus = lda.corpus
+    configurations = list(itertools.product(range(2), repeat=corpus.n_tokens))
+    log_joint = []
+    for configuration in configurations:
+        n_dk, n_wk, n_k = lda._count_topics(np.array(configuration))
+        log_joint.append(
+            np.sum(gammaln(n_dk + lda.alpha))
+            - np.sum(gammaln(n_dk.sum(axis=1) + lda.K * lda.alpha))
+            + np.sum(gammaln(n_wk + lda.beta))
+            - np.sum(gammaln(n_k + lda.W * lda.beta))
+        )
+    expected = np.exp(np.array(log_joint) - np.max(log_joint))
+    expected /= expected.sum()
+
+    n_dk, n_wk, n_k = lda._initialize_topics()
+    # Tables built once: rebuilding from counts including the tokens about to be sampled biases tiny corpora
+    gibbs_sampler = get_sampler("alias", lda.alpha, lda.beta, mh_steps=2, rebuild_every=10**9)
+    rng = np.random.default_rng(1)
+    n_sweeps = 20000
+    visits = np.zeros(len(configurations))
+    for _ in range(n_sweeps):
+        gibbs_sampler.sweep(
+            corpus.token_ids,
+            corpus.doc_offsets,
+            np.arange(corpus.n_docs),
+            corpus.topics,
+            n_dk,
+            n_wk,
+            n_k,
+            rng.random(corpus.n_tokens * gibbs_sampler.uniforms_per_token),
+        )
+        visits[configurations.index(tuple(corpus.topics))] += 1
+    assert np.allclose(visits / n_sweeps, expected, atol=0.02)
+
+
+# Test _fastlda_draw()
+
+
+def test_fastlda_draw_is_exact():
+    doc_counts = np.array([5, 0, 2, 9, 1, 0])
+    word_counts = np.array([0, 3, 1, 0, 4, 2])
+    n_k = np.array([20, 14, 30, 25, 11, 16])
+    alpha, beta, W_beta = 0.5, 0.1, 1.5
+    a, b, c = doc_counts + alpha, word_counts + beta, 1 / (n_k + W_beta)
+    expected = a * b * c / np.sum(a * b * c)
+
+    # The draw is a deterministic function of u, so a fine grid of u recovers its distribution
+    order = np.argsort(-doc_counts, kind="mergesort")
+    n_grid = 20000
+    draws = [
+        _fastlda_draw(
+            order,
+            doc_counts,
+            word_counts,
+            c,
+            alpha,
+            beta,
+            np.sum(a**3),
+            np.sum(b**3),
+            np.sum(c**3),
+            (j + 0.5) / n_grid,
+            np.empty(6),
+        )
+        for j in range(n_grid)
+    ]
+    frequencies = np.bincount(draws, minlength=6) / n_grid
+    assert np.allclose(frequencies, expected, atol=1e-3)
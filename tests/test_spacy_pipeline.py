@@ -0,0 +1,67 @@
+import os
+
+import pytest
+import spacy
+from spacy.language import Language
+
+from collapsed_lda.utility.spacy_pipeline import preprocess_spacy_docs
+
+
+@Language.component("lowercase_lemmatizer")
+def lowercase_lemmatizer(doc):
+    for token in doc:
+        token.lemma_ = token.lower_
+    return doc
+
+
+@Language.component("failing_component")
+def failing_component(doc):
+    raise RuntimeError("Disabled components should not run")
+
+
+@pytest.fixture()
+def blank_nlp():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("lowercase_lemmatizer")
+    nlp.add_pipe("failing_component")
+    return nlp
+
+
+TEXTS = ["The Cats sat on 2 mats", "Dogs bark at the cats", "An ox"]
+EXPECTED = [["cats", "sat", "mats"], ["dogs", "bark", "cats"], []]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_preprocess_spacy_docs_runs_enabled_components(blank_nlp, n_jobs):
+    lemmas = preprocess_spacy_docs(
+        TEXTS,
+        blank_nlp,
+        stop_words=["the"],
+        components=["lowercase_lemmatizer"],
+        batch_size=2,
+        n_jobs=n_jobs,
+    )
+    assert lemmas == EXPECTED
+    # The disabled component is enabled again afterwards
+    assert "failing_component" in blank_nlp.pipe_names
+
+
+def test_preprocess_spacy_docs_reads_cache(blank_nlp, tmp_path, monkeypatch):
+    kwargs = dict(stop_words=["the"], components=["lowercase_lemmatizer"], cache_dir=tmp_path)
+    assert preprocess_spacy_docs(TEXTS, blank_nlp, **kwargs) == EXPECTED
+    assert len(os.listdir(tmp_path)) == 1
+
+    # A cache hit never runs the pipeline
+    def failing_pipe(*args, **kwargs):
+        raise AssertionError("The pipeline should not run on a cache hit")
+
+    monkeypatch.setattr(blank_nlp, "pipe", failing_pipe)
+    assert preprocess_spacy_docs(TEXTS, blank_nlp, **kwargs) == EXPECTED
+
+
+def test_preprocess_spacy_docs_cache_depends_on_texts_and_stop_words(blank_nlp, tmp_path):
+    kwargs = dict(components=["lowercase_lemmatizer"], cache_dir=tmp_path)
+    preprocess_spacy_docs(TEXTS, blank_nlp, stop_words=["the"], **kwargs)
+    preprocess_spacy_docs(TEXTS, blank_nlp, stop_words=["cats"], **kwargs)
+    preprocess_spacy_docs(TEXTS[:2], blank_nlp, stop_words=["the"], **kwargs)
+    assert len(os.listdir(tmp_path)) == 3
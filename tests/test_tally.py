@@ -0,0 +1,42 @@
+from statistics import mode
+
+import numpy as np
+import pytest
+
+from collapsed_lda.tally import TopicTally
+
+
+def tally_chains(chains, K, n_slots):
+    """Feed per-token chains of shape (tokens, samples) through a tally, one state at a time"""
+    tally = TopicTally(chains.shape[0], K, chains.shape[1], n_slots=n_slots)
+    for sample in range(chains.shape[1]):
+        tally.update(chains[:, sample], sample)
+    return tally
+
+
+@pytest.mark.parametrize("n_slots", [1, 2, 8])
+def test_modes_match_mode_of_chain(n_slots):
+    rng = np.random.default_rng(0)
+    chains = rng.integers(0, 6, size=(300, 40))
+    tally = tally_chains(chains, K=6, n_slots=n_slots)
+    assert tally.modes().tolist() == [mode(chain) for chain in chains.tolist()]
+
+
+def test_ties_go_to_first_topic():
+    chains = np.array([[2, 1, 1, 2], [0, 3, 3, 0]])
+    tally = tally_chains(chains, K=4, n_slots=1)
+    assert tally.modes().tolist() == [2, 0]
+
+
+def test_only_overflowing_topics_are_stored_outside_slots():
+    chains = np.array([[0, 1, 2, 0], [3, 3, 3, 3]])
+    tally = tally_chains(chains, K=4, n_slots=2)
+    assert tally.overflow_keys.tolist() == [2]
+    assert tally.slot_topics.dtype == np.uint8
+
+
+def test_arrays_roundtrip():
+    chains = np.array([[0, 1, 2, 1], [3, 3, 0, 3]])
+    tally = tally_chains(chains, K=4, n_slots=1)
+    restored = TopicTally.from_arrays(tally.to_arrays("tally_"), "tally_", K=4, n_samples=4)
+    assert restored.modes().tolist() == tally.modes().tolist() == [1, 3]
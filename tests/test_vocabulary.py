@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from collapsed_lda.lda import LatentDirichletAllocation
+from collapsed_lda.vocabulary import Vocabulary
+
+
+@pytest.fixture()
+def doc_to_tokens():
+    return {
+        "doc_1": ["alpha", "bravo", "alpha", "charlie"],
+        "doc_2": ["alpha", "delta"],
+        "doc_3": ["bravo", "alpha", "echo", "echo", "echo"],
+    }
+
+
+def test_fit_transform_matches_from_documents_without_pruning(doc_to_tokens):
+    vocabulary = Vocabulary()
+    corpus = vocabulary.fit_transform(doc_to_tokens)
+    assert corpus.vocabulary == ["alpha", "bravo", "charlie", "delta", "echo"]
+    assert [corpus.tokens(d) for d in range(corpus.n_docs)] == list(doc_to_tokens.values())
+    assert vocabulary.term_frequency.tolist() == [4, 2, 1, 1, 3]
+    assert vocabulary.document_frequency.tolist() == [3, 2, 1, 1, 1]
+
+
+@pytest.mark.parametrize(
+    "options, expected_vocabulary",
+    [
+        ({"min_count": 2}, ["alpha", "bravo", "echo"]),
+        ({"min_df": 2}, ["alpha", "bravo"]),
+        ({"max_df": 0.9}, ["bravo", "charlie", "delta", "echo"]),
+        ({"keep_top_n": 2}, ["alpha", "echo"]),
+    ],
+)
+def test_fit_transform_prunes(doc_to_tokens, options, expected_vocabulary):
+    corpus = Vocabulary(**options).fit_transform(doc_to_tokens)
+    assert corpus.vocabulary == expected_vocabulary
+    for d, tokens in enumerate(doc_to_tokens.values()):
+        assert corpus.tokens(d) == [word for word in tokens if word in expected_vocabulary]
+
+
+def test_fit_transform_consumes_an_iterable_once(doc_to_tokens):
+    corpus = Vocabulary(min_count=2).fit_transform(iter(doc_to_tokens.items()))
+    assert corpus.doc_ids == ["doc_1", "doc_2", "doc_3"]
+    assert corpus.doc_offsets.tolist() == [0, 3, 4, 9]
+
+
+def test_transform_drops_unknown_words(doc_to_tokens):
+    vocabulary = Vocabulary(min_count=2)
+    vocabulary.fit_transform(doc_to_tokens)
+    corpus = vocabulary.transform({"new": ["echo", "foxtrot", "alpha"]})
+    assert corpus.tokens(0) == ["echo", "alpha"]
+    assert corpus.vocabulary == vocabulary.vocabulary
+
+
+def test_lda_accepts_built_corpus(doc_to_tokens):
+    corpus = Vocabulary(min_count=2).fit_transform(doc_to_tokens)
+    lda = LatentDirichletAllocation(corpus, K=2, verbose=False)
+    lda.fit(n_iter=2)
+    assert lda.phi_matrix.shape == (2, 3)
+    assert np.allclose(lda.theta_matrix.sum(axis=0), 1)